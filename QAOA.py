@@ -8,86 +8,267 @@ Description: QAOA for maxcut, travellings salesman and dominating set problem.
                  https://github.com/koenmesman/benchmark_qaoa_IBM
              This program contains functions to:
                  - Generate MCP, TSP and DSP xacc circuits
+                 - Compile parametric circuit templates once per QAOA run,
+                   extending cached layers of lower depth p
+                 - Cancel and merge redundant gates before compilation (see
+                   circuit_optimizer.py)
                  - Compute cost for MCP, TSP and DSP qubit measurements
-                 - Run QAOA using the scipy optimize function ('COBYLA')
-                 - Get local and remote runtimes for each QAOA job
+                   (vectorized, see expectation.py and cost_cache.py)
+                 - Run QAOA using the scipy optimize function ('COBYLA') or 
+                   parameter-shift gradient optimizers (see optimizers.py)
+                 - Get local and remote runtimes for each QAOA job, remote
+                   runtimes are retrieved in bulk after the run (see remote.py)
+                 - Trace the build, compile, execute and score stages of 
+                   every job (see tracing.py)
                  - Plot measured qubit results (if verbose)
                  - Print optimizer results (if verbose)
 """
 
-import xacc
 from math import pi
 import extra_gates as gates
-from scipy.optimize import minimize
+import expectation as exp
+import cost_cache as cc
+import circuit_optimizer as co
+import statevector as sv
+import optimizers as opt
+import tracing
+import remote
 import matplotlib.pyplot as plt
 import time
 import sys
-from qiskit import IBMQ 
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+#XACC is optional when only the native statevector backend is used
+try:
+    import xacc
+except ImportError:
+    xacc = None
+
+try:
+    from qiskit import IBMQ 
+except ImportError:
+    IBMQ = None
 
 #Global provider function to load IBM Accoutn credentials
-provider = IBMQ.load_account()
+provider = IBMQ.load_account() if IBMQ is not None else None
 
-def genTSPCircuit(qpu, qpu_id, graph, params):
-    """"
+#Remote runtime clients, created on first use: IonQ with cached credentials 
+#and connection pool, IBM per backend with cached backend object
+ionq_client = None
+ibm_clients = {}
+
+#Template circuit layers per problem graph: (initial state and layers, 
+#instruction offset after every layer), see buildLayers
+layer_cache = {}
+#Remote runs build circuits concurrently in threads (see remote.RemoteRunner)
+layer_lock = threading.Lock()
+
+#Local simulator backends, runtimes are measured by wall-clock
+LOCAL_BACKENDS = ['aer', 'qsim', 'qpp', 'native']
+
+def getAccelerator(qpu_id, shots = 2048, seed = None):
+    """
+    Parameters:
+        qpu_id : string - XACC accelerator name or 'native' for the built-in 
+                 NumPy statevector simulator
+        shots : int - Number of shots per circuit execution
+        seed : int - Seed of the shot sampling (native backend only)
+
+    Returns:
+        qpu : XACC Accelerator Object
+    """
+    
+    if qpu_id == 'native':
+        return sv.StatevectorSimulator(shots, seed)
+    
+    return xacc.getAccelerator(qpu_id, {'shots' : shots})
+
+def qalloc(qpu, n_qbits):
+    """
+    Parameters:
+        qpu : XACC Accelerator Object - Backend the buffer is allocated for
+        n_qbits : int - Number of qubits
+
+    Returns:
+        buffer : XACC AcceleratorBuffer Object
+    """
+    
+    if isinstance(qpu, sv.StatevectorSimulator):
+        return qpu.qalloc(n_qbits)
+    
+    return xacc.qalloc(n_qbits)
+
+def compileCircuit(qpu, qpu_id, circuit, name, params, peephole = True):
+    """
     Parameters:
         qpu : XACC Accelerator Object - Used for circuit compiler
         qpu_id : string - Used to do some additional mapping for IBM backend
-        graph : list - Contains information about graph size and edge
-        params : list - Parameters beta and gamma used by optimizer
+        circuit : Circuit - Instruction buffer of the kernel body
+        name : string - Kernel name
+        params : list - Numerical or symbolic parameters beta and gamma
+        peephole : bool - If true, cancel and merge redundant gates before 
+                   compilation (see circuit_optimizer.py)
 
     Returns:
         mapped_program : XACC Composite Intstruction
-    """   
+    """
     
-    compiler = xacc.getCompiler('xasm')
-    circuit = '__qpu__ void qaoa_tsp(qbit q){  \n'
+    if peephole:
+        with tracing.span('optimize', kernel = name):
+            circuit = co.optimize(circuit)
+    
+    with tracing.span('compile', kernel = name):
+        
+        #The native simulator executes the instruction buffer directly
+        if isinstance(qpu, sv.StatevectorSimulator):
+            variables = [P.name for P in params if isinstance(P, gates.Parameter)]
+            return sv.Program(name, variables, circuit.gates())
+        
+        #Serialize the instruction buffer to XASM once
+        source = ('__qpu__ void %s(qbit q%s){  \n' % (name, kernelArgs(params)) 
+                  + circuit.to_xasm() + '}')
+        
+        compiler = xacc.getCompiler('xasm')
+        program = compiler.compile(source, qpu)
+        
+        mapped_program = program.getComposite(name)
+    
+    if(qpu_id[0:3] == 'ibm'):
+        with tracing.span('placement'):
+            mapped_program.defaultPlacement(qpu)
+        
+    return mapped_program
+
+def templateParams(p):
+    """
+    Parameters:
+        p : int - Iterations used in QAOA circuit generation
+
+    Returns:
+        params : list - Symbolic parameters beta and gamma for a circuit template
+    """
+    
+    beta = [gates.Parameter('beta%i' % P) for P in range(p)]
+    gamma = [gates.Parameter('gamma%i' % P) for P in range(p)]
+    
+    return beta + gamma
+
+def kernelArgs(params):
+    """
+    Parameters:
+        params : list - Numerical or symbolic parameters beta and gamma
+
+    Returns:
+        args : string - Additional XASM kernel arguments for symbolic parameters
+    """
+    
+    return ''.join(', double %s' % P.name for P in params 
+                   if isinstance(P, gates.Parameter))
+
+def buildLayers(problem, graph, params, initFunc, layerFunc):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        graph : list - Contains information about graph size and edge
+        params : list - Parameters beta and gamma used by optimizer, either 
+                        numerical or symbolic (see templateParams)
+        initFunc : function - Adds the initial state preparation to a circuit
+        layerFunc : function - Adds the cost and mixer unitaries of a single 
+                    layer with angles beta and gamma to a circuit
+
+    Returns:
+        circuit : Circuit - Initial state and p layers, without measurements
+    """
     
     p = len(params)//2
     beta = params[:p]
     gamma = params[p:]
     
+    circuit = gates.Circuit()
+    
+    #Numerical circuits change every iteration and are built from scratch
+    names = [str(P) for P in templateParams(p)]
+    if [str(P) for P in params] != names:
+        initFunc(circuit, graph)
+        for P in range(p):
+            layerFunc(circuit, graph, beta[P], gamma[P])
+        return circuit
+    
+    #Template layers only depend on their own depth, so deeper circuits 
+    #extend the cached layers of shallower ones
+    key = (cc.graph_key(problem, graph), layerFunc.__name__)
+    with layer_lock:
+        if key not in layer_cache:
+            prefix = gates.Circuit()
+            initFunc(prefix, graph)
+            layer_cache[key] = (prefix, [len(prefix.instructions)])
+        prefix, offsets = layer_cache[key]
+        
+        for P in range(len(offsets) - 1, p):
+            layerFunc(prefix, graph, beta[P], gamma[P])
+            offsets.append(len(prefix.instructions))
+        
+        circuit.instructions = prefix.instructions[:offsets[p]]
+    
+    return circuit
+
+def genTSPCircuit(qpu, qpu_id, graph, params, peephole = True):
+    """"
+    Parameters:
+        qpu : XACC Accelerator Object - Used for circuit compiler
+        qpu_id : string - Used to do some additional mapping for IBM backend
+        graph : list - Contains information about graph size and edge
+        params : list - Parameters beta and gamma used by optimizer, either 
+                        numerical or symbolic (see templateParams)
+        peephole : bool - If true, optimize the circuit before compilation
+
+    Returns:
+        mapped_program : XACC Composite Intstruction
+    """   
+    
     num_nodes, A, D = graph
     num_qbits = num_nodes**2
     
+    circuit = buildLayers('TSP', graph, params, initTSP, layerTSP)
+    
+    #Measurements
+    for N in range(num_qbits):
+        circuit.add('Measure', (N,))
+    
+    return compileCircuit(qpu, qpu_id, circuit, 'qaoa_tsp', params, peephole)
+
+def initTSP(circuit, graph):
+    
+    num_nodes, A, D = graph
+    
     #Set inital state 
     for q in range(num_nodes):
         q_range = range(q*num_nodes, (q+1)*num_nodes)
-        circuit += gates.dicke_init(num_nodes, 2, q_range)
-    
-    #Cost unitary
-    for P in range(p):
-        for i in range(num_qbits):
-            circuit += ('Rz(q[%i], %f); \n' % (i, gamma[P]*D[i]/(2*pi)))
-            
-        for i in range(num_nodes):
-            for j in range(i):
-                if i != j:
-                    circuit += gates.rzz(20*gamma[P]/pi, j+i*num_nodes, i+j*num_nodes)
-    
-    #Mixer unitary
-        for i in range(0, num_nodes):
-            circuit += gates.rxx(-beta[P], i*num_nodes, (i*num_nodes+1))
-            circuit += gates.rxx(-beta[P], (i*num_nodes+1), (i*num_nodes+2))
+        gates.dicke_init(num_nodes, 2, q_range, circuit)
 
-            circuit += gates.ryy(-beta[P], i*num_nodes, (i*num_nodes+1))
-            circuit += gates.ryy(-beta[P], (i*num_nodes+1), (i*num_nodes+2))
+def layerTSP(circuit, graph, beta, gamma):
     
-    #Measurements
-    for N in range(num_qbits):
-        circuit += ('Measure(q[%i]); \n' % N)
+    num_nodes, A, D = graph
+    num_qbits = num_nodes**2
     
-    #Finish circuit        
-    circuit += ('}')
-        
-    #print(circuit)     
+    #Cost unitary
+    for i in range(num_qbits):
+        circuit.add('Rz', (i,), gamma*D[i]/(2*pi))
         
-    program = compiler.compile(circuit, qpu)
+    for i in range(num_nodes):
+        for j in range(i):
+            if i != j:
+                gates.rzz(20*gamma/pi, j+i*num_nodes, i+j*num_nodes, circuit)
     
-    mapped_program = program.getComposite('qaoa_tsp')
-    if(qpu_id[0:3] == 'ibm'):
-        mapped_program.defaultPlacement(qpu)
-        
-    return mapped_program
+    #Mixer unitary
+    for i in range(0, num_nodes):
+        gates.rxx(-beta, i*num_nodes, (i*num_nodes+1), circuit)
+        gates.rxx(-beta, (i*num_nodes+1), (i*num_nodes+2), circuit)
+
+        gates.ryy(-beta, i*num_nodes, (i*num_nodes+1), circuit)
+        gates.ryy(-beta, (i*num_nodes+1), (i*num_nodes+2), circuit)
 
 def getTSPExpectation(counts, graph):
     """
@@ -99,109 +280,130 @@ def getTSPExpectation(counts, graph):
         total_cost : float - Cost result for certain counts and graph
     """
     
-    v, A, D = graph
-    
-    out_state = counts
-    total_count = 0
-    total_cost = 0
-    for t in out_state:
-        count = int(out_state.get(t))
-        total_count += count
-        bin_len = "{0:0" + str(v) + "b}"  # string required for binary formatting
-        bin_val = t.format(bin_len)
-        bin_val = [int(i) for i in bin_val]
-        cost = 0
-        coupling = []
-        for i in range(v):
-            for j in range(i):
-                if i != j:
-                    coupling.append([i+j*v, j+i*v])
-
-        for i in range(0, v):
-            for j in range(i, v):
-                cost += 0.5*D[i + v*j]*bin_val[i + v*j]
-        for j in coupling:
-            cost += -5*(1 - 2*bin_val[j[0]])*(1 - 2*bin_val[j[1]])
-        total_cost += cost*count
-        
-        total_cost = -total_cost/total_count
-
-    return total_cost
+    return getExpectation('TSP', counts, graph)
 
 
-def genDSPCircuit(qpu, qpu_id, graph, params):
+def genDSPCircuit(qpu, qpu_id, graph, params, synthesis = 'auto', 
+                  peephole = True):
     """
     Parameters:
         qpu : XACC Accelerator Object - Used for circuit compiler
         qpu_id : string - Used to do some additional mapping for IBM backend
         graph : list - Contains information about graph size and edge
-        params : list - Parameters beta and gamma used by optimizer
+        params : list - Parameters beta and gamma used by optimizer, either 
+                        numerical or symbolic (see templateParams)
+        synthesis : string - OR oracle of the cost unitary, 'gray' (no 
+                    ancillas), 'chain' (OR_2q chain into ancillas) or 'auto'
+                    (the one with fewer CX gates per neighbourhood)
+        peephole : bool - If true, optimize the circuit before compilation
 
     Returns:
         mapped_program : XACC Composite Intstruction
     """   
     
-    p = len(params)//2
-    beta = params[:p]
-    gamma = params[p:]
-    
     v, edge_list = graph
-    vertice_list = list(range(0, v, 1))
+    
+    circuit = buildLayers('DSP', graph, params, initDSP, DSP_LAYERS[synthesis])
+    
+    #Measure results
+    for N in range(v):
+        circuit.add('Measure', (N,))
+        
+    return compileCircuit(qpu, qpu_id, circuit, 'qaoa_dsp', params, peephole)
 
-    connections = []
-    for i in range(v):
-        connections.append([i])
+def dspNeighbourhoods(graph):
+    """
+    Parameters:
+        graph : list - Contains information about graph size and edge
+
+    Returns:
+        neighbourhoods : list - Per node, the node followed by its neighbours
+    """
+    
+    v, edge_list = graph
+    
+    neighbours = [set() for i in range(v)]
     for t in edge_list:
-        connections[t[0]].append(t[1])
-        connections[t[1]].append(t[0])
-    ancillas = 0
-    for con in connections:
-        if len(con) > ancillas:
-            ancillas = len(con)
-    n = v+ancillas         # add ancillas
-    
-    compiler = xacc.getCompiler('xasm')
-    circuit = '__qpu__ void qaoa_dsp(qbit q){  \n'
-
-    for qubit in range(v):
-        
-        #Initialize to |+>
-        circuit +=  ('H(q[%i]); \n' % qubit)
-        
-        #inverted crz gate
-        circuit +=  ('X(q[%i]); \n' % qubit)
-        circuit +=  gates.crz(-gamma[0], qubit, n-1)
-        circuit +=  ('X(q[%i]); \n' % qubit)
-        
-    for iteration in range(p):
-        f = 0
-        f_anc = v
-        for con in connections:  # TODO: fix for unordered edges e.g. (2,0)
-            c_len = len(con)
-            OR_range = con.copy()
-            for k in range(c_len-1):
-                OR_range.append(v+k)
-                
-            OR_range.append(n-1)
-            
-            circuit += gates.OR_nrz(c_len, gamma[p-1], OR_range)
+        if t[0] != t[1]:
+            neighbours[t[0]].add(t[1])
+            neighbours[t[1]].add(t[0])
+    
+    return [[i] + sorted(neighbours[i]) for i in range(v)]
 
-        for qb in vertice_list:
-            circuit += ('Rx(q[%i], %f); \n' % (qb, -2*beta[p-1]))
+def dspGray(n, synthesis = 'auto'):
+    """
+    Parameters:
+        n : int - Size of the neighbourhood OR
+        synthesis : string - OR oracle of the cost unitary (see genDSPCircuit)
+
+    Returns:
+        gray : bool - If true, the OR uses the Gray code oracle, otherwise the
+               OR_2q chain. 'auto' picks the Gray code oracle (2^n - 2 CX) 
+               only if it needs fewer CX gates than the chain (16(n-1) CX), 
+               i.e. for n <= 6
+    """
     
-    #Measure results
+    if(synthesis == 'auto'):
+        return 2**n - 2 < 16*(n - 1)
+    
+    return synthesis == 'gray'
+
+def dspQubits(graph, synthesis = 'auto'):
+    """
+    Parameters:
+        graph : list - Contains information about graph size and edge
+        synthesis : string - OR oracle of the cost unitary (see genDSPCircuit)
+
+    Returns:
+        n_qbits : int - Node qubits, plus the ancillas of the largest 
+                  neighbourhood OR synthesized as a chain, which are reused 
+                  by all chained neighbourhoods
+    """
+    
+    chained = [len(con) for con in dspNeighbourhoods(graph) 
+               if not dspGray(len(con), synthesis)]
+    
+    return graph[0] + max(chained, default = 1) - 1
+
+def initDSP(circuit, graph):
+    
+    v, edge_list = graph
+    
+    #Set inital state to superposition
     for N in range(v):
-        circuit += ('Measure(q[%i]); \n' % N)
-        
-    circuit += ('}')  
-        
-    program = compiler.compile(circuit, qpu)
+        circuit.add('H', (N,))
+
+def layerDSP(circuit, graph, beta, gamma, synthesis = 'auto'):
     
-    mapped_program = program.getComposite('qaoa_dsp')
-    if(qpu_id[0:3] == 'ibm'):
-        mapped_program.defaultPlacement(qpu)
-       
-    return mapped_program
+    v, edge_list = graph
+    
+    #Cost unitary exp(i*gamma*(T + D)), phase gamma for every unused node...
+    for N in range(v):
+        circuit.add('Rz', (N,), -gamma)
+    
+    #...and for every dominated node
+    for con in dspNeighbourhoods(graph):
+        if dspGray(len(con), synthesis):
+            gates.OR_phase(len(con), gamma, con, circuit)
+        else:
+            #Ancillas are uncomputed after each OR
+            OR_range = con + list(range(v, v + len(con) - 1))
+            gates.OR_nrz(len(con), gamma, OR_range, circuit)
+    
+    #Mixer unitary
+    for N in range(v):
+        circuit.add('Rx', (N,), -2*beta)
+
+def layerDSPGray(circuit, graph, beta, gamma):
+    
+    layerDSP(circuit, graph, beta, gamma, 'gray')
+
+def layerDSPChain(circuit, graph, beta, gamma):
+    
+    layerDSP(circuit, graph, beta, gamma, 'chain')
+
+#Layer function per OR oracle synthesis of the DSP cost unitary
+DSP_LAYERS = {'auto' : layerDSP, 'gray' : layerDSPGray, 'chain' : layerDSPChain}
 
 def getDSPExpectation(counts, graph):
     """
@@ -213,93 +415,54 @@ def getDSPExpectation(counts, graph):
         total_cost : float - Cost result for certain counts and graph
     """
     
-    v, edge_list = graph   
-    vertice_list = list(range(0, v, 1))
-    connections = []
-    
-    for i in range(v):
-        connections.append([i])
-    for t in edge_list:
-        connections[t[0]].append(t[1])
-        connections[t[1]].append(t[0])
-    total_count = 0
-    total_cost = 0
-    
-    for key in counts:
-        count = int(counts.get(key))
-        total_count += count
-        bin_len = "{0:0" + str(v) + "b}"  # string required for binary formatting
-        bin_val = key.format(bin_len)
-        bin_val = [int(i) for i in bin_val]
-        bin_val.reverse()
-        T = 0
-        for con in connections:
-            tmp = 0
-            for k in con:
-                tmp = tmp or bin_val[k]
-                if tmp:
-                    T += 1
-                    break
-        D = 0
-        for i in range(v):
-            D += 1 - bin_val[i]
-        total_cost += (T+D)*count
-    total_cost = -total_cost/total_count
-    return total_cost
-
-def genMaxcutCircuit(qpu, qpu_id, graph, params):
+    return getExpectation('DSP', counts, graph)
+
+def genMaxcutCircuit(qpu, qpu_id, graph, params, peephole = True):
     """
     Parameters:
         qpu : XACC Accelerator Object - Used for circuit compiler
         qpu_id : string - Used to do some additional mapping for IBM backend
         graph : list - Contains information about graph size and edge
-        params : list - Parameters beta and gamma used by optimizer
+        params : list - Parameters beta and gamma used by optimizer, either 
+                        numerical or symbolic (see templateParams)
+        peephole : bool - If true, optimize the circuit before compilation
 
     Returns:
         mapped_program : XACC Composite Intstruction
     """
     
-    compiler = xacc.getCompiler('xasm')
-    circuit = '__qpu__ void qaoa_maxcut(qbit q){  \n'
-    
-    p = len(params)//2
-    beta = params[:p]
-    gamma = params[p:]
-    
     v, edge_list = graph
     
-    #Set inital state to superposition
-    for N in range(v):
-        circuit += ('H(q[%i]); \n' % N)
-    
-    for P in range(p):  
-            
-        #For all edges, set cost Hamiltonian
-        for E in edge_list:            
-            circuit += ('CX(q[%i], q[%i]); \n' % (E[0], E[1]))
-            circuit += ('Rz(q[%i], %f); \n' % (E[1], gamma[P]))
-            circuit += ('CX(q[%i], q[%i]); \n' % (E[0], E[1]))
-        
-        #Apply mixer hamilonian to all qubits    
-        for N in range(v):
-            circuit += ('Rx(q[%i], %f); \n' % (N, beta[P]))
+    circuit = buildLayers('maxcut', graph, params, initMaxcut, layerMaxcut)
             
     #Measure results
     for N in range(v):
-        circuit += ('Measure(q[%i]); \n' % N)
+        circuit.add('Measure', (N,))
         
-    circuit += ('}')
-        
-    #print(circuit)     
-        
-    program = compiler.compile(circuit, qpu)
+    return compileCircuit(qpu, qpu_id, circuit, 'qaoa_maxcut', params, peephole)
+
+
+def initMaxcut(circuit, graph):
     
-    mapped_program = program.getComposite('qaoa_maxcut')
-    if(qpu_id[0:3] == 'ibm'):
-        mapped_program.defaultPlacement(qpu)
-        
-    return mapped_program
+    v, edge_list = graph
+    
+    #Set inital state to superposition
+    for N in range(v):
+        circuit.add('H', (N,))
 
+def layerMaxcut(circuit, graph, beta, gamma):
+    
+    v, edge_list = graph
+    
+    #For all edges, set cost Hamiltonian
+    for E in edge_list:            
+        circuit.add('CX', (E[0], E[1]))
+        circuit.add('Rz', (E[1],), gamma)
+        circuit.add('CX', (E[0], E[1]))
+    
+    #Apply mixer hamilonian to all qubits    
+    for N in range(v):
+        circuit.add('Rx', (N,), beta)
 
 def getMaxcutExpectation(counts, graph):
     """
@@ -311,27 +474,30 @@ def getMaxcutExpectation(counts, graph):
         total_cost : float - Cost result for certain counts and graph
     """
     
-    def maxcut_obj(x, graph):
-        
-        edge_list = graph[1]
-        obj = 0
-        for i, j in edge_list:
-            if x[i] != x[j]:
-                obj -= 1
-                
-        return obj
-    
-    avg = 0
-    sum_count = 0
-    for bitstring, count in counts.items():
-        
-        obj = maxcut_obj(bitstring, graph)
-        avg += obj * count
-        sum_count += count
-        
-    return avg/sum_count
+    return getExpectation('maxcut', counts, graph)
 
-def getOptFunction(qpu, graph, buffer, qpu_id, circuitFunc, expFunc, job_runtimes):
+def getExpectation(problem, counts, graph):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        counts : dict - Number of measurements per qubit bitstring
+        graph : list - Contains information about graph size and edge
+
+    Returns:
+        total_cost : float - Cost result for certain counts and graph
+    """
+    
+    #Look up precomputed costs if the graph is small enough to tabulate
+    if cc.cache.supports(problem, graph):
+        return cc.cache.get(problem, graph).expectation(counts)
+    
+    states, weights, n_bits = exp.counts_to_arrays(counts)
+    cost = exp.score_states(problem, states, n_bits, graph)
+    
+    return exp.expectation(cost, weights)
+
+def getOptFunction(qpu, graph, buffer, qpu_id, circuitFunc, expFunc, job_runtimes, template = None, 
+                   diagonal = None, history = None, ledger = None):
     """
     Parameters:
         qpu : XACC Accelerator Object - Used for circuitFunc       
@@ -341,6 +507,13 @@ def getOptFunction(qpu, graph, buffer, qpu_id, circuitFunc, expFunc, job_runtime
         circuitFunc : function - Circuit funtion to generate problem circuit
         expFunc : function - Expectation function to compute cost
         job_runtimes : list - List to store job runtimes
+        template : XACC Composite Instruction - Compiled parametric circuit, 
+                   if given only beta and gamma are bound every iteration
+        diagonal : numpy array - Cost of every measured basis state, if given 
+                   the exact expectation is computed from the probabilities
+        history : list - If given, the expectation of every job is appended
+        ledger : RuntimeLedger - If given, the job is recorded and its runtime
+                 is retrieved after the run instead of after every job
 
     Returns:
         execute_circuit: function - Used by optimizer to execute QPU
@@ -348,19 +521,144 @@ def getOptFunction(qpu, graph, buffer, qpu_id, circuitFunc, expFunc, job_runtime
         
     def execute_circ(params):
         
-        program = circuitFunc(qpu, qpu_id, graph, params)
+        if template is not None:
+            with tracing.span('bind'):
+                program = template.eval([float(P) for P in params])
+        else:
+            with tracing.span('build'):
+                program = circuitFunc(qpu, qpu_id, graph, params)
+        
+        with tracing.span('execute'):
+            start = time.time()
+            qpu.execute(buffer, program)
+        with tracing.span('runtime'):
+            if ledger is not None:
+                ledger.record(job_runtimes, buffer)
+            else:
+                job_runtimes.append(getRuntime(qpu_id, buffer, start))
         
-        start = time.time()
-        qpu.execute(buffer, program)        
-        job_runtimes.append(getRuntime(qpu_id, buffer, start))
-        results = buffer.getMeasurementCounts()
+        if diagonal is not None:
+            with tracing.span('counts'):
+                probs = buffer.getProbabilities()
+            with tracing.span('score'):
+                expectation = exp.exact_expectation(probs, diagonal)
+        else:
+            with tracing.span('counts'):
+                results = buffer.getMeasurementCounts()
+            with tracing.span('score'):
+                expectation = expFunc(results, graph) 
         
-        expectation = expFunc(results, graph) 
+        if history is not None:
+            history.append(expectation)
         
         return expectation
     
     return execute_circ
 
+def getBatchOptFunction(qpu, graph, buffer, qpu_id, circuitFunc, expFunc, job_runtimes, template = None, 
+                        diagonal = None, history = None, ledger = None):
+    """
+    Parameters:
+        Same as getOptFunction, buffer is only used for its size
+
+    Returns:
+        execute_batch: function - Used by optimizer to execute a list of 
+                       parameter sets as a single accelerator job
+    """
+    
+    def execute_batch(points):
+        
+        if template is not None:
+            with tracing.span('bind', circuits = len(points)):
+                programs = [template.eval([float(P) for P in params]) for params in points]
+        else:
+            with tracing.span('build', circuits = len(points)):
+                programs = [circuitFunc(qpu, qpu_id, graph, params) for params in points]
+        
+        #Submit all circuits at once, results are stored in child buffers. 
+        #XACC appends children to a buffer, so every batch gets a fresh one
+        batch_buffer = qalloc(qpu, buffer.size())
+        with tracing.span('execute', circuits = len(points)):
+            start = time.time()
+            qpu.execute(batch_buffer, programs)
+        with tracing.span('runtime'):
+            if ledger is not None:
+                ledger.record(job_runtimes, batch_buffer, len(programs))
+            else:
+                #Runtime of the job is divided over its circuits
+                runtime = getRuntime(qpu_id, batch_buffer, start)
+                if runtime is not None:
+                    runtime /= len(programs)
+                job_runtimes.extend([runtime]*len(programs))
+        
+        expectations = []
+        for child in batch_buffer.getChildren()[-len(programs):]:
+            
+            if diagonal is not None:
+                with tracing.span('counts'):
+                    probs = child.getProbabilities()
+                with tracing.span('score'):
+                    expectation = exp.exact_expectation(probs, diagonal)
+            else:
+                with tracing.span('counts'):
+                    results = child.getMeasurementCounts()
+                with tracing.span('score'):
+                    expectation = expFunc(results, graph)
+            
+            if history is not None:
+                history.append(expectation)
+            expectations.append(expectation)
+        
+        return expectations
+    
+    return execute_batch
+
+def getBatchFunction(optFunc, workerFuncs = [], job_runtimes = None, history = None):
+    """
+    Parameters:
+        optFunc : function - Optimizer function used for sequential execution
+        workerFuncs : list - (optimizer function, runtimes, history) per 
+                      worker, each with its own buffer and private lists, 
+                      used to execute the circuits of a batch in parallel
+        job_runtimes : list - Shared list to store job runtimes
+        history : list - Shared list of expectation values per job
+
+    Returns:
+        execute_batch: function - Used by optimizer to execute a list of 
+                       parameter sets
+    """
+    
+    def execute_batch(points):
+        
+        if len(workerFuncs) < 2 or len(points) == 1:
+            return [optFunc(x) for x in points]
+        
+        #Every worker executes its share of the batch on its own buffer and
+        #keeps the runtime and expectation of every point
+        def run_share(w):
+            func, runtimes, hist = workerFuncs[w]
+            share = []
+            for x in points[w::len(workerFuncs)]:
+                expectation = func(x)
+                share.append((expectation, runtimes.pop(), hist.pop()))
+            return share
+        
+        with ThreadPoolExecutor(len(workerFuncs)) as pool:
+            shares = list(pool.map(run_share, range(len(workerFuncs))))
+        
+        results = [None]*len(points)
+        for w, share in enumerate(shares):
+            results[w::len(workerFuncs)] = share
+        
+        #Runtimes and expectations are merged in point order
+        for expectation, runtime, hist in results:
+            job_runtimes.append(runtime)
+            history.append(hist)
+            
+        return [expectation for expectation, runtime, hist in results]
+    
+    return execute_batch
+
 def getRuntime(qpu_id, buffer, start):
     """
     Parameters:
@@ -369,7 +667,8 @@ def getRuntime(qpu_id, buffer, start):
         start: float - Start time of QAOA job
         
     Returns:
-        runtime : float - Runtime of a backend in ms
+        runtime : float - Runtime of a backend in ms, None if a remote 
+                  runtime could not be retrieved (see remote.fill_missing)
     """
     
     runtime = 0
@@ -378,35 +677,18 @@ def getRuntime(qpu_id, buffer, start):
     #IBM runtimes:  
     if(qpu_id[0:3] == 'ibm'): #Remote runtime        
         
-        #Receive IBM job results via qiskit
-        ibm_backend = qpu_id[4:]
-        backend = provider.get_backend(ibm_backend)
-        ID = buffer.getInformation().get('ibm-job-id')
-        
-        #Retreive job information
-        job = backend.retrieve_job(ID)
-        times = job.time_per_step()
-        t_complete = times.get('COMPLETED')
-        t_run = times.get('RUNNING')
-        if(type(t_complete) !=  type(t_run)): #Sometimes, complete time is not retreived properly
-            print("IBM data error, inserting 0")
-            runtime = 0
-        else:
-            #Compute runtime
-            timeDelta = t_complete - t_run
-            runtime = timeDelta.total_seconds()*1000 #s to ms    
-        
-        
+        #Receive IBM job results via qiskit, the backend is cached
+        client = ibm_clients.setdefault(qpu_id, remote.IBMClient(provider, qpu_id))
+        runtime = client.runtime(client.job_id(buffer))
     
     elif(qpu_id == 'ionq'):
-        import requests
-        key = open('/home/huub/.ionq_config').readline().split(':')[1].strip()
-        headers = {'Authorization': 'apiKey '+str(key)}
-        params = {'limit': 1} #Only retrieve most recent job execution
-        response = requests.get('https://api.ionq.co/v0.1/jobs/', headers=headers, params=params)
-        runtime = response.json().get('jobs')[0].get('execution_time')
-    
-    elif(qpu_id in ['aer', 'qsim', 'qpp']): #Local runtime
+        #Look up the submitted job, not the most recent one of the account
+        global ionq_client
+        if ionq_client is None:
+            ionq_client = remote.IonQClient()
+        runtime = ionq_client.runtimes([ionq_client.job_id(buffer)])[0]
+    
+    elif(qpu_id in LOCAL_BACKENDS): #Local runtime
         runtime = (end - start)*1000 #s to ms
         
     else:
@@ -414,7 +696,49 @@ def getRuntime(qpu_id, buffer, start):
     
     return runtime
 
-def runQAOA(qpu, qpu_id, graph, problem, p, verbose = True):
+def getLedger(qpu_id):
+    """
+    Parameters:
+        qpu_id : string - QPU backend
+
+    Returns:
+        ledger : RuntimeLedger - Deferred runtime lookups for remote backends,
+                 None for local backends
+    """
+    
+    if(qpu_id[0:3] == 'ibm'):
+        return remote.RuntimeLedger(ibm_clients.setdefault(qpu_id, remote.IBMClient(provider, qpu_id)))
+    elif(qpu_id == 'ionq'):
+        return remote.RuntimeLedger(remote.IonQClient())
+    
+    return None
+
+def problemQubits(problem, graph, synthesis = 'auto'):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        graph : list - Contains information about graph size and edge
+        synthesis : string - OR oracle of the DSP cost unitary (see genDSPCircuit)
+
+    Returns:
+        n_qbits : int - Number of qubits allocated for the QAOA circuit
+    """
+    
+    nodes = graph[0]
+    
+    if(problem == 'TSP'):
+        #The size 2 circuit also uses qubit 4
+        if nodes == 2:
+            return nodes**2 + 1
+        return nodes**2
+    elif(problem == 'DSP'):
+        return dspQubits(graph, synthesis)
+    
+    return nodes
+
+def runQAOA(qpu, qpu_id, graph, problem, p, verbose = True, template = True, exact = False,
+            optimizer = 'COBYLA', workers = 1, batch = False, info = None, deferred = True,
+            initParams = None, synthesis = 'auto', peephole = True):
     """
     Parameters:
         qpu : XACC Accelerator Object - Used to generate optimizer function  
@@ -423,6 +747,28 @@ def runQAOA(qpu, qpu_id, graph, problem, p, verbose = True):
         problem : string - Sets problem to be used (maxcut, TSP, DSP)
         p : int - Iterations used in QAOA circuit generation
         verbose : bool - If true, print optimizer results and draw QAOA counts
+        template : bool - If true, compile the circuit once with symbolic 
+                   parameters and only bind beta and gamma every iteration
+        exact : bool - If true, optimize the exact expectation value computed 
+                from the state probabilities instead of the sampled shots 
+                (native backend only)
+        optimizer : string - Classical optimizer, see optimizers.METHODS
+        workers : int - Number of parallel circuit executions per optimizer 
+                  step on the native backend (gradient based optimizers)
+        batch : bool - If true, the circuits of one optimizer step are 
+                submitted as a single accelerator job (SPSA, GRID and 
+                gradient based optimizers)
+        info : dict - If given, filled with the expectation 'history' per job, 
+               the optimizer result 'opt_result', the optimized 'params' and 
+               the 'counts' and 'expectation' of the optimized circuit
+        deferred : bool - If true, runtimes of remote jobs are retrieved in 
+                   bulk after the optimization instead of after every job
+        initParams : list - Initial parameters beta and gamma, defaults to 
+                     [1.0]*2*p (see param_transfer.py for warm starts)
+        synthesis : string - OR oracle of the DSP cost unitary, 'auto', 
+                    'gray' or 'chain' (see genDSPCircuit)
+        peephole : bool - If true, circuits are optimized by the peephole pass 
+                   before compilation (see circuit_optimizer.py)
     
     Returns:
         result_list : list - Returns 8 best bitstring QAOA results
@@ -430,40 +776,87 @@ def runQAOA(qpu, qpu_id, graph, problem, p, verbose = True):
     """
     
     #Setup QAOA objects and required problem functions
-    nodes = graph[0]
-    
     if(problem == 'maxcut'):
-        circuitFunc = genMaxcutCircuit
+        circuitFunc = partial(genMaxcutCircuit, peephole = peephole)
         expFunc = getMaxcutExpectation
-        n_qbits = nodes      
     elif(problem == 'TSP'):
-        circuitFunc = genTSPCircuit
+        circuitFunc = partial(genTSPCircuit, peephole = peephole)
         expFunc = getTSPExpectation
-        if nodes == 2:
-            n_qbits = nodes**2 + 1
-        else:
-            n_qbits = nodes**2
     elif(problem == 'DSP'):
-        circuitFunc = genDSPCircuit
+        circuitFunc = partial(genDSPCircuit, synthesis = synthesis, peephole = peephole)
         expFunc = getDSPExpectation
-        n_qbits = nodes + 5 #For regular graphs
     else:
         sys.exit('Unknown problem set: Exit...')
-        
-    buffer = xacc.qalloc(n_qbits)
+    
+    n_qbits = problemQubits(problem, graph, synthesis)
+    buffer = qalloc(qpu, n_qbits)
+    
+    #Compile parametric circuit once
+    program_template = None
+    if template:
+        with tracing.span('build', template = True):
+            program_template = circuitFunc(qpu, qpu_id, graph, templateParams(p))
+    
+    #Precompute the cost of every basis state for exact expectation values
+    diagonal = None
+    if exact:
+        if hasattr(buffer, 'getProbabilities'):
+            diagonal = cc.cache.get(problem, graph).diagonal
+        else:
+            print("Exact expectation not supported by "+str(qpu_id)+", sampling shots")
     
     #Find optimal values
     job_runtimes = []
-    optFunc = getOptFunction(qpu, graph, buffer, qpu_id, circuitFunc, expFunc, job_runtimes)
-    initParams = [1.0]*2*p
-    optResult = minimize(optFunc, initParams, method='COBYLA', options={'maxiter': 250})
+    history = []
+    ledger = getLedger(qpu_id) if deferred else None
+    optFunc = getOptFunction(qpu, graph, buffer, qpu_id, circuitFunc, expFunc, 
+                             job_runtimes, program_template, diagonal, history, ledger)
+    
+    if batch:
+        #Circuits of one optimizer step are submitted as a single job
+        batchFunc = getBatchOptFunction(qpu, graph, buffer, qpu_id, circuitFunc, expFunc, 
+                                        job_runtimes, program_template, diagonal, history, 
+                                        ledger)
+    else:
+        #Shifted circuits of one optimizer step run in parallel on the native 
+        #backend, the XACC accelerators are not known to be thread-safe
+        workerFuncs = []
+        if qpu_id == 'native' and workers > 1:
+            for w in range(workers):
+                runtimes, hist = [], []
+                workerFuncs.append((getOptFunction(qpu, graph, qalloc(qpu, n_qbits), qpu_id, 
+                                                   circuitFunc, expFunc, runtimes, 
+                                                   program_template, diagonal, hist), 
+                                    runtimes, hist))
+        batchFunc = getBatchFunction(optFunc, workerFuncs, job_runtimes, history)
+    
+    if initParams is None:
+        initParams = [1.0]*2*p
+    optResult = opt.minimize(optFunc, initParams, optimizer, batchFunc, maxiter = 250)
+    if ledger is not None:
+        with tracing.span('runtime', deferred = True):
+            ledger.resolve(job_runtimes)
+    remote.fill_missing(job_runtimes)
+    if info is not None:
+        info['history'] = history
+        info['opt_result'] = optResult
+        info['params'] = [float(P) for P in optResult.x]
     if verbose : print(optResult) 
     optParams = optResult.x
     
     #Show results
-    program = circuitFunc(qpu, qpu_id, graph, optParams)
+    if template:
+        program = program_template.eval([float(P) for P in optParams])
+    else:
+        program = circuitFunc(qpu, qpu_id, graph, optParams)
     qpu.execute(buffer, program)
     results = buffer.getMeasurementCounts()
+    if info is not None:
+        info['counts'] = results
+        if diagonal is not None:
+            info['expectation'] = exp.exact_expectation(buffer.getProbabilities(), diagonal)
+        else:
+            info['expectation'] = expFunc(results, graph)
     
     #Plot results
     if verbose :
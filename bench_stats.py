@@ -0,0 +1,97 @@
+"""
+Project: QAOA Benchmarks XACC platform
+Description: Statistics for the repeated benchmark mode. Every (problem,
+             backend, size) is run several times with different seeds and
+             graph instances. Runs are screened for outliers with Tukey's
+             fences and summarized by the median, the interquartile range and
+             a percentile bootstrap confidence interval of the median, which
+             are robust against the occasional slow remote job.
+"""
+
+import numpy as np
+
+def tukey_outliers(values, k = 1.5):
+    """
+    Parameters:
+        values : list - Measurements of repeated runs
+        k : float - Fence distance in interquartile ranges
+
+    Returns:
+        outliers : numpy array - Boolean mask of values outside the fences
+                   [Q1 - k*IQR, Q3 + k*IQR]
+    """
+
+    values = np.asarray(values, dtype=float)
+    q1, q3 = np.percentile(values, [25, 75])
+    iqr = q3 - q1
+
+    return (values < q1 - k*iqr) | (values > q3 + k*iqr)
+
+def bootstrap_ci(values, stat = np.median, n_boot = 2000, alpha = 0.05, seed = None):
+    """
+    Parameters:
+        values : list - Measurements of repeated runs
+        stat : function - Statistic to bootstrap
+        n_boot : int - Number of bootstrap resamples
+        alpha : float - Confidence level is 1 - alpha
+        seed : int - Seed of the resampling
+
+    Returns:
+        low, high : float - Percentile bootstrap confidence interval
+    """
+
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        return float(values[0]), float(values[0])
+
+    rng = np.random.default_rng(seed)
+    samples = rng.choice(values, size = (n_boot, len(values)), replace = True)
+    estimates = stat(samples, axis = 1)
+    low, high = np.percentile(estimates, [100*alpha/2, 100*(1 - alpha/2)])
+
+    return float(low), float(high)
+
+def summarize(values, exclude_outliers = True, alpha = 0.05, seed = 0):
+    """
+    Parameters:
+        values : list - Measurements of repeated runs
+        exclude_outliers : bool - If true, Tukey outliers are left out of the
+                           statistics
+        alpha : float - Confidence level of the interval is 1 - alpha
+        seed : int - Seed of the bootstrap, fixed for reproducible reports
+
+    Returns:
+        summary : dict - n, outliers, median, q1, q3, iqr, ci_low and ci_high
+    """
+
+    values = np.asarray(values, dtype=float)
+    outliers = tukey_outliers(values) if len(values) >= 4 else np.zeros(len(values), dtype=bool)
+    if exclude_outliers and not outliers.all():
+        values = values[~outliers]
+
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    ci_low, ci_high = bootstrap_ci(values, alpha = alpha, seed = seed)
+
+    return {'n' : len(values), 'outliers' : int(outliers.sum()), 'median' : float(median),
+            'q1' : float(q1), 'q3' : float(q3), 'iqr' : float(q3 - q1),
+            'ci_low' : ci_low, 'ci_high' : ci_high}
+
+def run_statistics(runs):
+    """
+    Parameters:
+        runs : list - Job runtimes (in ms) of every repeated run
+
+    Returns:
+        statistics : dict - Summaries of the average job runtime (ms), the
+                     number of optimizer iterations and the total QAOA
+                     runtime (s) over the runs
+    """
+
+    return {'mean' : summarize([sum(r)/len(r) for r in runs]),
+            'iterations' : summarize([len(r) for r in runs]),
+            'total' : summarize([sum(r)/1000 for r in runs])} #ms to s
+
+def format_summary(name, summary):
+    return ('%-40s n=%-3i outliers=%-2i median=%10.3f IQR=%10.3f CI=[%.3f, %.3f]'
+            % (name, summary['n'], summary['outliers'], summary['median'], summary['iqr'],
+               summary['ci_low'], summary['ci_high']))
@@ -0,0 +1,162 @@
+"""
+Project: QAOA Benchmarks XACC platform
+Description: Peephole optimization of generated circuits before they are
+             compiled. The gate generators of extra_gates.py emit redundant
+             sequences at their boundaries, e.g. H·H between consecutive rxx
+             gates, Rx(pi/2)·Rx(-pi/2) between ryy gates and T gates of
+             neighbouring Toffolis. A single pass over the instruction buffer
+             tracks the gates on every qubit and
+                 - cancels adjacent self-inverse gates (H, X, CX)
+                 - merges adjacent rotations about the same axis, numerical
+                   angles or symbolic angles of the same parameter
+                 - drops rotations by a multiple of 2pi (a global phase)
+                 - commutes Rz through CX controls, Rx through CX targets and
+                   CX gates with a shared control or target to find partners
+             The unitary of the circuit is unchanged up to a global phase.
+             Comments are not kept.
+"""
+
+from math import pi, remainder
+from numbers import Number
+import extra_gates as gates
+
+SELF_INVERSE = {'H', 'X', 'CX'}
+ROTATIONS = {'Rx', 'Ry', 'Rz'}
+
+#Angles below this tolerance (modulo 2pi) are treated as zero
+TOLERANCE = 1e-9
+
+def merge_angles(theta0, theta1):
+    """
+    Parameters:
+        theta0, theta1 : float or Parameter - Angles of two rotations
+
+    Returns:
+        theta : float or Parameter - Angle of the merged rotation, None if the
+                angles can not be added (different or mixed parameters)
+    """
+
+    if isinstance(theta0, Number) and isinstance(theta1, Number):
+        return theta0 + theta1
+    if (isinstance(theta0, gates.Parameter) and isinstance(theta1, gates.Parameter)
+            and theta0.name == theta1.name):
+        return gates.Parameter(theta0.name, theta0.coef + theta1.coef)
+
+    return None
+
+def is_zero(theta):
+    if isinstance(theta, gates.Parameter):
+        return abs(theta.coef) < TOLERANCE
+
+    return abs(remainder(theta, 2*pi)) < TOLERANCE
+
+def commutes(inst, qubit, gate):
+    """
+    Parameters:
+        inst : tuple - Earlier (gate, qubits, angle) instruction on qubit
+        qubit : int - Qubit shared by inst and gate
+        gate : tuple - Later (gate, qubits, angle) instruction
+
+    Returns:
+        commutes : bool - If true, gate can be moved before inst on qubit
+    """
+
+    if inst[0] != 'CX':
+        return False
+    control, target = inst[1]
+
+    if gate[0] == 'Rz':
+        return qubit == control
+    elif gate[0] == 'Rx':
+        return qubit == target
+    elif gate[0] == 'CX' and gate[1] != inst[1]:
+        #CX gates commute if they only share their control or their target
+        return (gate[1][0] == control) if qubit == control else (gate[1][1] == target)
+
+    return False
+
+class Optimizer:
+    """
+    Single pass peephole optimizer. Kept gates are stored in order, with the
+    indices of the gates acting on each qubit.
+    """
+
+    def __init__(self):
+        self.out = []
+        self.wires = {}
+
+    def partner(self, gate):
+        """
+        Returns:
+            index : int - Index of the earlier gate that gate can be cancelled
+                    or merged with, after commuting it back on all of its
+                    qubits. None if there is no such gate
+        """
+
+        found = set()
+        for qubit in gate[1]:
+            wire = self.wires.get(qubit, [])
+            k = len(wire) - 1
+            while k >= 0 and commutes(self.out[wire[k]], qubit, gate):
+                k -= 1
+            if k < 0:
+                return None
+            found.add(wire[k])
+
+        if len(found) != 1:
+            return None
+        index = found.pop()
+        gate0, qubits0, theta0 = self.out[index]
+        if gate0 != gate[0] or qubits0 != gate[1]:
+            return None
+
+        return index
+
+    def remove(self, index):
+        for qubit in self.out[index][1]:
+            self.wires[qubit].remove(index)
+        self.out[index] = None
+
+    def add(self, gate):
+        name, qubits, theta = gate
+
+        if name in ROTATIONS and is_zero(theta):
+            return
+
+        if name in SELF_INVERSE or name in ROTATIONS:
+            index = self.partner(gate)
+            if index is not None:
+                if name in SELF_INVERSE:
+                    self.remove(index)
+                    return
+                merged = merge_angles(self.out[index][2], theta)
+                if merged is not None:
+                    if is_zero(merged):
+                        self.remove(index)
+                    else:
+                        self.out[index] = (name, qubits, merged)
+                    return
+
+        for qubit in qubits:
+            self.wires.setdefault(qubit, []).append(len(self.out))
+        self.out.append(gate)
+
+    def circuit(self):
+        circuit = gates.Circuit()
+        circuit.instructions = [inst for inst in self.out if inst is not None]
+        return circuit
+
+def optimize(circuit):
+    """
+    Parameters:
+        circuit : Circuit - Generated circuit, numerical or symbolic
+
+    Returns:
+        circuit : Circuit - Equivalent circuit with fewer gates, without comments
+    """
+
+    optimizer = Optimizer()
+    for gate in circuit.gates():
+        optimizer.add(gate)
+
+    return optimizer.circuit()
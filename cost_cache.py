@@ -0,0 +1,210 @@
+"""
+Project: QAOA Benchmarks XACC platform
+Description: Cache of precomputed cost Hamiltonian tables, keyed by a canonical
+             hash of the problem graph. Every entry holds the diagonal cost of
+             all measured basis states together with the DSP neighbourhood or
+             TSP coupling tables as compact NumPy arrays. Entries are evicted
+             least recently used when the memory bound is exceeded and can
+             optionally be persisted on disk, so the tables are shared across
+             backends and repeated runs on the same graph.
+"""
+
+import os
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+import expectation as exp
+
+#Version of the cached data, part of every key. Increased when the stored bit 
+#order or cost functions change, such that persisted entries are recomputed
+KEY_VERSION = 2
+
+def graph_key(problem, graph):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        graph : list - Contains information about graph size and edge
+
+    Returns:
+        key : string - Canonical hash of problem and graph
+    """
+
+    if(problem == 'TSP'):
+        v, A, D = graph
+        canonical = '%s|%i|%s|%s' % (problem, v, list(A), list(D))
+    else:
+        v, edge_list = graph
+        edges = sorted(tuple(sorted(edge[:2])) for edge in edge_list)
+        canonical = '%s|%i|%s' % (problem, v, edges)
+
+    canonical += '|v%i' % KEY_VERSION
+
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+def measured_bits(problem, graph):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        graph : list - Contains information about graph size and edge
+
+    Returns:
+        n_bits : int - Number of measured qubits of the problem circuit
+    """
+
+    return graph[0]**2 if problem == 'TSP' else graph[0]
+
+class CostTables:
+    """
+    Precomputed cost tables of a single problem graph.
+    """
+
+    def __init__(self, problem, graph, diagonal = None, tables = None):
+        self.problem = problem
+        self.graph = graph
+        self.n_bits = measured_bits(problem, graph)
+
+        if tables is None:
+            if(problem == 'DSP'):
+                tables = {'neighbourhood' : exp.dsp_neighbourhoods(graph)}
+            elif(problem == 'TSP'):
+                linear, coupling = exp.tsp_coupling(graph)
+                tables = {'linear' : linear, 'coupling' : coupling}
+            else:
+                tables = {}
+        self.tables = tables
+
+        if diagonal is None:
+            diagonal = exp.cost_diagonal(problem, graph, self.n_bits)
+            #Costs are integers or halves, float32 represents them exactly
+            diagonal = diagonal.astype(np.float32)
+        self.diagonal = diagonal
+
+    def nbytes(self):
+        return self.diagonal.nbytes + sum(t.nbytes for t in self.tables.values())
+
+    def score(self, states):
+        """
+        Parameters:
+            states : numpy array - Bitstrings packed as unsigned integers
+
+        Returns:
+            cost : numpy array - Cost per bitstring
+        """
+
+        return self.diagonal[states.astype(np.intp)]
+
+    def expectation(self, counts):
+        """
+        Parameters:
+            counts : dict - Number of measurements per qubit bitstring
+
+        Returns:
+            expectation : float - Average cost of the measurements
+        """
+
+        states, weights, n_bits = exp.counts_to_arrays(counts)
+        return exp.expectation(self.score(states), weights)
+
+class CostCache:
+    """
+    LRU cache of CostTables with a memory bound and optional persistence.
+    """
+
+    def __init__(self, max_bytes = 2**30, max_bits = 26, cache_dir = None):
+        """
+        Parameters:
+            max_bytes : int - Memory bound of all cached tables
+            max_bits : int - Largest number of measured qubits to tabulate
+            cache_dir : string - Directory to persist tables, e.g.
+                        './data/cost_cache', None keeps them in memory only
+        """
+
+        self.max_bytes = max_bytes
+        self.max_bits = max_bits
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.size = 0
+        #Guards entries and size, the cache is shared by threads of remote 
+        #runs and parallel workers
+        self.lock = threading.Lock()
+        self.computing = {}
+
+    def supports(self, problem, graph):
+        return measured_bits(problem, graph) <= self.max_bits
+
+    def get(self, problem, graph):
+        """
+        Parameters:
+            problem : string - Problem set (maxcut, TSP, DSP)
+            graph : list - Contains information about graph size and edge
+
+        Returns:
+            tables : CostTables - Cached or newly computed cost tables
+        """
+
+        key = graph_key(problem, graph)
+        with self.lock:
+            tables = self.lookup(key)
+            if tables is not None:
+                return tables
+            key_lock = self.computing.setdefault(key, threading.Lock())
+
+        #Tables are computed once per key, other threads wait for them
+        with key_lock:
+            with self.lock:
+                tables = self.lookup(key)
+                if tables is not None:
+                    return tables
+
+            tables = self.load(key, problem, graph)
+            if tables is None:
+                tables = CostTables(problem, graph)
+                self.save(key, tables)
+
+            with self.lock:
+                self.entries[key] = tables
+                self.size += tables.nbytes()
+                self.computing.pop(key, None)
+
+                #Evict least recently used tables, but always keep the newest one
+                while self.size > self.max_bytes and len(self.entries) > 1:
+                    _, evicted = self.entries.popitem(last = False)
+                    self.size -= evicted.nbytes()
+
+        return tables
+
+    def lookup(self, key):
+        #Cached tables of key as most recently used, call with lock held
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def load(self, key, problem, graph):
+        if self.cache_dir is None or not os.path.isfile(self.path(key)):
+            return None
+
+        with np.load(self.path(key)) as data:
+            arrays = {name : data[name] for name in data.files}
+        diagonal = arrays.pop('diagonal')
+
+        return CostTables(problem, graph, diagonal, arrays)
+
+    def save(self, key, tables):
+        if self.cache_dir is None:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok = True)
+        
+        #Write to a temporary file first, concurrent workers may share the cache
+        tmp = self.path(key) + '.%i.%i.tmp' % (os.getpid(), threading.get_ident())
+        with open(tmp, 'wb') as file:
+            np.savez(file, diagonal = tables.diagonal, **tables.tables)
+        os.replace(tmp, self.path(key))
+
+#Global cache shared by all QAOA runs in this process
+cache = CostCache()
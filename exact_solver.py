@@ -2,10 +2,27 @@
 Exact solvers for maxcut, traveling salesman and dominating set problem.
 Original code: https://github.com/koenmesman/benchmark_qaoa_IBM
 Edited by: huub-d96
+
+The maxcut and dominating set solvers enumerate all assignments as integer 
+bitmasks in NumPy blocks, scoring them with edge and neighbourhood masks. For
+large graphs the assignment space is split in contiguous ranges that are 
+searched on a process pool and reduced at the end. The TSP solver scores 
+permutation matrices with the QAOA cost function, enumerating them for small 
+graphs and using a Held-Karp dynamic program for larger ones. Optima are 
+cached on disk per problem graph, so exponential-time baselines are only
+computed once.
 '''
 
+import os
+import json
+import threading
+import multiprocessing as mp
 import generate_graph as gg
-from itertools import permutations, combinations_with_replacement
+import expectation as exp
+import cost_cache as cc
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import permutations, combinations_with_replacement, islice
 
 def bitfield(n):
     return [int(digit) for digit in bin(n)[2:]]
@@ -24,166 +41,566 @@ def flatten(t):
     return [item for sublist in t for item in sublist]
 
 def adjacencies(nodes):
-    hamming_sets = hamming_2(nodes)
-    #set = combinations(hamming_sets, nodes)
-    superset = combinations_with_replacement(hamming_sets, nodes)
-    #print(list(superset))
-    flatset = []
-    megaset = []
-    for subset in superset:
-      megaset.append(permutations(list(subset)))
-    for subset in megaset:
-      for subsubset in subset:
-        #flatset.append(flatten(list(subsubset)))
-        flatset.append(list(subsubset))
-
-    #this still returns a lot of duplicates, finding the set of uniques is to be implemented
-    return flatset
-
-def mcp_solver(g):
-    result = 0
-    array = []
+    #Lazily yield every distinct ordering of each multiset of hamming sets
+    hamming_sets = [tuple(h) for h in hamming_2(nodes)]
+    for subset in combinations_with_replacement(hamming_sets, nodes):
+        for subsubset in set(permutations(subset)):
+            yield [list(h) for h in subsubset]
+
+def node_masks(size, edges):
+    """
+    Parameters:
+        size : int - Number of nodes
+        edges : list - Edge list
+
+    Returns:
+        edge_masks : list - (bit_a, bit_b) bit positions per edge
+        nbh_masks : numpy array - Bitmask of every node and its neighbours
+    
+    Node k is the k-th character of a bitstring, i.e. bit size-1-k.
+    """
+    
+    bit = lambda k: size - 1 - k
+    edge_masks = [(bit(e[0]), bit(e[1])) for e in edges]
+    
+    nbh_masks = [1 << bit(k) for k in range(size)]
+    for a, b in edges:
+        nbh_masks[a] |= 1 << bit(b)
+        nbh_masks[b] |= 1 << bit(a)
+    
+    return edge_masks, np.array(nbh_masks, dtype=np.uint64)
+
+def popcount(states):
+    """
+    Number of set bits of every state in a uint64 array
+    """
+    
+    return np.unpackbits(states.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+def mcp_values(states, edge_masks):
+    """
+    Parameters:
+        states : numpy array - Assignments as uint64 bitmasks
+        edge_masks : list - Bit positions per edge, see node_masks
+
+    Returns:
+        cut : numpy array - Cut size per assignment
+    """
+    
+    cut = np.zeros(len(states), dtype=np.int32)
+    for a, b in edge_masks:
+        cut += (((states >> np.uint64(a)) ^ (states >> np.uint64(b))) & np.uint64(1)).astype(np.int32)
+    
+    return cut
+
+def dsp_values(states, size, nbh_masks):
+    """
+    Parameters:
+        states : numpy array - Assignments as uint64 bitmasks
+        size : int - Number of nodes
+        nbh_masks : numpy array - Neighbourhood bitmasks, see node_masks
+
+    Returns:
+        score : numpy array - Dominated neighbourhoods plus unused nodes
+    """
+    
+    T = np.zeros(len(states), dtype=np.int32)
+    for mask in nbh_masks:
+        T += (states & mask) != 0
+    D = size - popcount(states)
+    
+    return T + D
+
+#Number of assignments scored at once
+BLOCK_SIZE = 2**18
+
+#Stop flag and searched block counter shared with the pool workers, set by
+#init_worker (None outside of parallel_search)
+_stop = None
+_blocks = None
+
+def init_worker(stop, blocks):
+    global _stop, _blocks
+    _stop, _blocks = stop, blocks
+
+def search_range(lo, hi, valueFunc, block_size = BLOCK_SIZE):
+    """
+    Parameters:
+        lo, hi : int - Range of assignments to enumerate
+        valueFunc : function - Value of a block of uint64 assignments
+        block_size : int - Number of assignments scored at once
+
+    Returns:
+        result : int - Maximum value in the range, None if the search was 
+                 stopped (see parallel_search)
+        states : list - All assignments reaching the maximum
+    """
+    
+    result = None
+    states = []
+    for start in range(lo, hi, block_size):
+        if _stop is not None and _stop.is_set():
+            return None, []
+        
+        block = np.arange(start, min(start + block_size, hi), dtype=np.uint64)
+        values = valueFunc(block)
+        best = values.max()
+        
+        if result is None or best > result:
+            result = best
+            states = []
+        if best == result:
+            states.extend(int(x) for x in block[values == best])
+        
+        if _blocks is not None:
+            with _blocks.get_lock():
+                _blocks.value += 1
+    
+    return int(result), states
+
+def search_chunk(problem, g, lo, hi):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, DSP)
+        g : list - Contains information about graph size and edge
+        lo, hi : int - Range of assignments to enumerate
+
+    Returns:
+        result : int - Maximum value in the range, None if stopped
+        states : list - All assignments reaching the maximum
+    """
+    
     size, edges = g
-    for n in range(2**size):
-        node_array = bitfield(n)         
-        node_array = [0]*(size-len(node_array)) + node_array    
-        #node_array.extend([0]*(size-len(node_array)))
-        node_array = [-1 if x == 0 else 1 for x in node_array]
-        
-        
-        c = 0
-        for e in edges:
-            c += 0.5 * (1 - int(node_array[e[0]]) * int(node_array[e[1]]))
-           
-        if c >= result:
-            if c > result:
-                array.clear()   
-            array.append(''.join(map(str, [0 if x == -1 else 1 for x in node_array])))    
-            result = c  
-        #print(array)             
-        
-    return array
-
-def mcp_score(max_size):
+    edge_masks, nbh_masks = node_masks(size, edges)
+    
+    if(problem == 'maxcut'):
+        valueFunc = lambda x: mcp_values(x, edge_masks)
+    elif(problem == 'DSP'):
+        valueFunc = lambda x: dsp_values(x, size, nbh_masks)
+    else:
+        raise ValueError('Unknown problem set: '+str(problem))
+    
+    return search_range(lo, hi, valueFunc)
+
+def print_progress(done, total):
+    print("Exact search: %i/%i blocks (%.0f%%)" % (done, total, 100*done/total))
+
+def parallel_search(problem, g, workers = None, chunks = None, progress = print_progress,
+                    cancel = None):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, DSP)
+        g : list - Contains information about graph size and edge
+        workers : int - Number of worker processes, defaults to all cores
+        chunks : int - Number of contiguous assignment ranges, defaults to 
+                 4 per worker
+        progress : function - Called with (done, total) searched blocks, at 
+                   most once per second, or None
+        cancel : threading.Event - If set, the workers stop after their 
+                 current block
+
+    Returns:
+        result : int - Maximum value, None if the search was cancelled
+        states : list - All assignments reaching the maximum
+    """
+    
+    n_states = 2**g[0]
+    if workers is None:
+        workers = os.cpu_count()
+    if chunks is None:
+        chunks = 4*workers
+    chunks = max(1, min(chunks, n_states))
+    
+    bounds = [n_states*i//chunks for i in range(chunks + 1)]
+    ranges = list(zip(bounds[:-1], bounds[1:]))
+    total = sum(-(-(hi - lo)//BLOCK_SIZE) for lo, hi in ranges)
+    
+    ctx = mp.get_context()
+    stop = ctx.Event()
+    blocks = ctx.Value('q', 0)
+    
+    with ProcessPoolExecutor(workers, mp_context = ctx, initializer = init_worker,
+                             initargs = (stop, blocks)) as pool:
+        
+        pending = {pool.submit(search_chunk, problem, g, lo, hi) for lo, hi in ranges}
+        
+        #Reduce the local optima of all workers
+        result = None
+        states = []
+        reported = 0
+        while pending:
+            finished, pending = wait(pending, timeout = 1, return_when = FIRST_COMPLETED)
+            
+            if cancel is not None and cancel.is_set():
+                #Running chunks stop after their current block
+                stop.set()
+                for future in pending:
+                    future.cancel()
+                return None, []
+            
+            for future in finished:
+                chunk_result, chunk_states = future.result()
+                if result is None or chunk_result > result:
+                    result = chunk_result
+                    states = []
+                if chunk_result == result:
+                    states.extend(chunk_states)
+            
+            done = blocks.value
+            if progress is not None and done != reported:
+                progress(done, total)
+                reported = done
+    
+    return result, sorted(states)
+
+def mcp_solver(g, workers = 1):
+    """
+    Parameters:
+        g : list - Contains information about graph size and edge
+        workers : int - Number of worker processes, None uses all cores
+
+    Returns:
+        result : int - Maximum cut size
+        array : list - All optimal bitstrings, character k is node k
+    """
+    
+    size, edges = g
+    
+    if workers == 1:
+        result, states = search_chunk('maxcut', g, 0, 2**size)
+    else:
+        result, states = parallel_search('maxcut', g, workers)
+    array = [format(x, '0%ib' % size) for x in states]
+        
+    return result, array
+
+def mcp_score(max_size, workers = 1):
     opt_results = [0] * (max_size - 4)
     for i in range(5, max_size+1):
-        print(i)
         graph = gg.regular_graph(i)
-        opt_results[i - 5] = mcp_solver(graph)
-        print(opt_results)
+        optimum, array = cache.get('maxcut', graph, workers)
+        opt_results[i - 5] = (-optimum, array)
     return opt_results
 
-def dsp_score(graph):
-    
-    
-    result = 0
-    c = 0
-    size = graph.number_of_nodes()
-    edges = [list(edge) for edge in graph.edges()]   
-    connections = []
-    
-    for k in range(size):
-        connections.append([k])
-    for t in edges:
-        connections[t[0]].append(t[1])
-        connections[t[1]].append(t[0])
-    for n in range(2 ** size):
-        node_array = bitfield(n)
-        zero_array = [0] * (size - len(node_array))
-        node_array = zero_array + node_array
-        T = 0
-        for con in connections:
-            tmp = 0
-            for k in con:
-                tmp = tmp or node_array[k]
-                if tmp:
-                    T += 1
-                    break
-        D = 0
-        for j in range(size):
-            D += 1 - node_array[j]
-        c = (T + D)
-        if c >= result:
-            result = c
+def dsp_solver(g, workers = 1):
+    """
+    Parameters:
+        g : list - Contains information about graph size and edge
+        workers : int - Number of worker processes, None uses all cores
+
+    Returns:
+        result : int - Maximum of dominated neighbourhoods plus unused nodes
+        array : list - All optimal bitstrings, character k is node k
+    """
+    
+    size, edges = g
+    
+    if workers == 1:
+        result, states = search_chunk('DSP', g, 0, 2**size)
+    else:
+        result, states = parallel_search('DSP', g, workers)
+    array = [format(x, '0%ib' % size) for x in states]
+    
+    return result, array
+
+def dsp_score(graph, workers = 1):
+    
+    #Accept networkx graphs as well as [size, edges] lists
+    if hasattr(graph, 'number_of_nodes'):
+        graph = [graph.number_of_nodes(), [list(edge) for edge in graph.edges()]]
+    
+    result, array = dsp_solver(graph, workers)
     
     return result
 
-def tsp_score(tsp_graph):
+def tsp_weights(tsp_graph):
+    """
+    Parameters:
+        tsp_graph : list - Contains information about graph size, adjacency 
+                    and distances
+
+    Returns:
+        w : numpy array - (size, size) linear cost of x[i][j], equal to the 
+            QAOA cost function (see expectation.tsp_coupling)
+        offset : float - Coupling penalty of the all-zero assignment
+    """
     
     size, A, D = tsp_graph
-    coupling = []
-    opt_array = []
-    result = 10**8
-    for i in range(size):
-        for j in range(i):
-            if i != j:
-                #coupling.append([i + j * size, j + i * size])
-                coupling.append([j, i])
-    print("evaluating all possible configurations, this might take a while.")
-    #node_array_set = adjacencies(size)
-    node_array_set = tsp_arrays(size)
-    for node_array in node_array_set:
-        cost = 0
-        for i in range(0, size):
-            for j in range(0, size):
-                #cost += D[i + size * j] * node_array[i + size * j]
-                cost += 0.5*D[i*size + j] * node_array[i][j]
-        for j in coupling:
-            cost += -5 * (1 - 2 * node_array[j[0]][j[1]]) * (1 - 2 * node_array[j[1]][j[0]])
-        if cost <= result:
-            double_flag = 0;
-            # for array in node_array:
-            #     if (array.count(1) != 1):
-            #         double_flag = 1
-            if(not double_flag):        
-                print(node_array)
-                total = []
-                for i in node_array:
-                    total += i
-                opt_array.append(''.join(map(str, total)))
-            result = cost
-    opt_results = result
-    print(D)
-    return opt_results, opt_array
+    linear, coupling = exp.tsp_coupling(tsp_graph)
+    
+    return linear.reshape(size, size), -5*len(coupling)
 
-def tsp_arrays(n):
+def tsp_enumerate(tsp_graph, block_size = 5040):
+    """
+    Parameters:
+        tsp_graph : list - Contains information about graph size, adjacency 
+                    and distances
+        block_size : int - Number of permutation matrices scored at once
+
+    Returns:
+        result : float - Minimum cost over all permutation matrices
+        opt_array : list - All optimal permutation matrices as bitstrings
+    """
     
-    perms =  [list(perm) for perm in permutations(range(3))]
-    array_set = []
+    size = tsp_graph[0]
+    tables = exp.tsp_coupling(tsp_graph)
+    rows = np.arange(size)
     
-    for perm in perms:
-        ones_array = []
-        
-        for i in range(n):
-            ones = []
-            for j in range (n):
-                ones.append(0)
-            ones_array.append(ones)    
+    result = None
+    opt_array = []
+    perms = permutations(range(size))
+    while True:
+        block = np.array(list(islice(perms, block_size)), dtype=np.intp)
+        if len(block) == 0:
+            break
         
+        #Permutation matrices, flattened row by row
+        bits = np.zeros((len(block), size*size), dtype=np.int8)
+        bits[np.arange(len(block))[:, None], rows*size + block] = 1
+        cost = exp.tsp_cost(bits, tsp_graph, tables)
+        best = cost.min()
         
+        if result is None or best < result:
+            result = best
+            opt_array = []
+        if best == result:
+            opt_array.extend(''.join(map(str, b)) for b in bits[cost == best])
+    
+    return float(result), opt_array
+
+def tsp_held_karp(tsp_graph):
+    """
+    Held-Karp style dynamic program over node subsets. The cost of a 
+    permutation matrix splits into independent cycle costs: fixed points and 
+    2-cycles only pay their distances, every node on a longer cycle adds a
+    coupling penalty of 10. Minimum cycle costs per subset follow from 
+    Held-Karp, after which the optimal cycle cover is found by a second 
+    dynamic program over subsets.
+
+    Parameters:
+        tsp_graph : list - Contains information about graph size, adjacency 
+                    and distances
+
+    Returns:
+        result : float - Minimum cost over all permutation matrices
+        opt_array : list - One optimal permutation matrix as bitstring
+    """
+    
+    size = tsp_graph[0]
+    w, offset = tsp_weights(tsp_graph)
+    full = (1 << size) - 1
+    inf = float('inf')
+    
+    #Shortest directed paths from the lowest node of a subset: path[S][last]
+    path = np.full((1 << size, size), inf)
+    parent = np.full((1 << size, size), -1, dtype=np.int64)
+    for s in range(size):
+        path[1 << s, s] = 0
+    for S in range(1, full + 1):
+        start = (S & -S).bit_length() - 1
+        for last in range(size):
+            cost = path[S, last]
+            if cost == inf:
+                continue
+            for nxt in range(start + 1, size):
+                if S & (1 << nxt):
+                    continue
+                T = S | (1 << nxt)
+                if cost + w[last, nxt] < path[T, nxt]:
+                    path[T, nxt] = cost + w[last, nxt]
+                    parent[T, nxt] = last
+    
+    #Cheapest cycle through every subset
+    cycle = np.full(1 << size, inf)
+    cycle_last = np.full(1 << size, -1, dtype=np.int64)
+    for S in range(1, full + 1):
+        start = (S & -S).bit_length() - 1
+        n_nodes = bin(S).count('1')
+        penalty = 10*n_nodes if n_nodes > 2 else 0
+        closing = path[S] + w[:, start] + penalty
+        if n_nodes == 1:
+            closing = np.full(size, inf)
+            closing[start] = w[start, start]
+        cycle_last[S] = int(np.argmin(closing))
+        cycle[S] = closing[cycle_last[S]]
+    
+    #Optimal cycle cover: the cycle containing the lowest node is chosen first
+    cover = np.full(1 << size, inf)
+    choice = np.zeros(1 << size, dtype=np.int64)
+    cover[0] = 0
+    for S in range(1, full + 1):
+        low = S & -S
+        rest = S ^ low
+        C = rest
+        while True:
+            sub = C | low
+            if cycle[sub] + cover[S ^ sub] < cover[S]:
+                cover[S] = cycle[sub] + cover[S ^ sub]
+                choice[S] = sub
+            if C == 0:
+                break
+            C = (C - 1) & rest
+    
+    #Reconstruct the permutation from the chosen cycles
+    perm = [0]*size
+    S = full
+    while S:
+        sub = int(choice[S])
+        start = (sub & -sub).bit_length() - 1
+        last = int(cycle_last[sub])
+        perm[last] = start
+        T = sub
+        while last != start:
+            prev = int(parent[T, last])
+            perm[prev] = last
+            T ^= 1 << last
+            last = prev
+        S ^= sub
+    
+    bits = [0]*(size*size)
+    for i in range(size):
+        bits[i*size + perm[i]] = 1
+    
+    return float(cover[full] + offset), [''.join(map(str, bits))]
+
+def tsp_score(tsp_graph, max_enumerate = 8):
+    """
+    Parameters:
+        tsp_graph : list - Contains information about graph size, adjacency 
+                    and distances
+        max_enumerate : int - Largest size for which all permutation matrices 
+                        are enumerated, larger sizes use tsp_held_karp
+
+    Returns:
+        opt_results : float - Minimum cost over all permutation matrices
+        opt_array : list - Optimal permutation matrices as bitstrings
+    """
+    
+    if tsp_graph[0] <= max_enumerate:
+        return tsp_enumerate(tsp_graph)
+    
+    return tsp_held_karp(tsp_graph)
+
+def tsp_arrays(n):
+    """
+    Lazily generate all n x n permutation matrices as nested lists
+    """
+    
+    for perm in permutations(range(n)):
+        ones_array = [[0]*n for i in range(n)]
         for i in range(n):
             ones_array[i][perm[i]] = 1
         
-        array_set.append(ones_array)
-        
-    return array_set
-        
-        
-        
-        
-        
-        
-        
-        
-        
+        yield ones_array
+
+def solve(problem, graph, workers = 1):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        graph : list - Contains information about graph size and edge
+        workers : int - Number of worker processes, None uses all cores
+
+    Returns:
+        optimum : float - Minimum of the QAOA objective (see expectation.py), 
+                  for TSP the minimum over feasible routes (permutation 
+                  matrices) only, infeasible bitstrings may have lower cost
+        array : list - Optimal bitstrings, character k is node (or TSP 
+                qubit) k
+    """
+    
+    if(problem == 'maxcut'):
+        result, array = mcp_solver(graph, workers)
+    elif(problem == 'DSP'):
+        result, array = dsp_solver(graph, workers)
+    elif(problem == 'TSP'):
+        cost, array = tsp_score(graph)
+        return cost, array
+    else:
+        raise ValueError('Unknown problem set: '+str(problem))
+    
+    #The QAOA objectives of maxcut and DSP are minimized negated scores
+    return -result, array
+
+class OptimumCache:
+    """
+    Persistent cache of exact optima and optimal bitstrings, one JSON file per
+    problem graph keyed by cost_cache.graph_key.
+    """
+    
+    def __init__(self, cache_dir = './data/exact'):
+        """
+        Parameters:
+            cache_dir : string - Directory to persist optima, None keeps them
+                        in memory only
+        """
         
+        self.cache_dir = cache_dir
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.computing = {}
+    
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+    
+    def get(self, problem, graph, workers = 1):
+        """
+        Parameters:
+            problem : string - Problem set (maxcut, TSP, DSP)
+            graph : list - Contains information about graph size and edge
+            workers : int - Worker processes used on a cache miss
+
+        Returns:
+            optimum : float - Minimum of the QAOA objective
+            array : list - Optimal bitstrings, see solve
+        """
         
+        key = cc.graph_key(problem, graph)
+        with self.lock:
+            if key in self.entries:
+                return self.entries[key]
+            key_lock = self.computing.setdefault(key, threading.Lock())
         
+        #Optima are solved once per key, other threads wait for them
+        with key_lock:
+            with self.lock:
+                if key in self.entries:
+                    return self.entries[key]
+            
+            entry = self.load(key)
+            if entry is None:
+                entry = solve(problem, graph, workers)
+                self.save(key, problem, graph, entry)
+            
+            with self.lock:
+                self.entries[key] = entry
+                self.computing.pop(key, None)
         
+        return entry
+    
+    def load(self, key):
+        if self.cache_dir is None or not os.path.isfile(self.path(key)):
+            return None
         
+        with open(self.path(key)) as file:
+            data = json.load(file)
         
+        return data['optimum'], data['bitstrings']
+    
+    def save(self, key, problem, graph, entry):
+        if self.cache_dir is None:
+            return
         
+        os.makedirs(self.cache_dir, exist_ok = True)
+        optimum, array = entry
+        data = {'problem' : problem, 'size' : graph[0], 'optimum' : optimum,
+                'bitstrings' : array}
         
-    
-    
-    
+        #Write to a temporary file first, concurrent processes and threads may
+        #share the cache
+        tmp = self.path(key) + '.%i.%i.tmp' % (os.getpid(), threading.get_ident())
+        with open(tmp, 'w') as file:
+            json.dump(data, file)
+        os.replace(tmp, self.path(key))
+
+#Global cache shared by all exact solver calls in this process
+cache = OptimumCache()
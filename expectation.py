@@ -0,0 +1,226 @@
+"""
+Project: QAOA Benchmarks XACC platform
+Description: Vectorized expectation engine for the maxcut, dominating set and
+             travelling salesman cost functions. Measurement counts are
+             converted once to a packed integer array of bitstrings and a
+             vector of counts, after which every bitstring is scored with
+             NumPy array operations:
+                 - Maxcut: XOR over the edge list
+                 - DSP: OR over every vertex neighbourhood
+                 - TSP: Distance and penalty quadratic form
+             For exact simulations the full diagonal of the cost Hamiltonian
+             is evaluated once, after which the expectation value is a dot
+             product with the probability vector.
+"""
+
+import numpy as np
+
+def counts_to_arrays(counts):
+    """
+    Parameters:
+        counts : dict - Number of measurements per qubit bitstring
+
+    Returns:
+        states : numpy array - Bitstrings packed as unsigned integers, the
+                 first character of a bitstring is the most significant bit
+        weights : numpy array - Number of measurements per bitstring
+        n_bits : int - Length of the measured bitstrings
+    """
+
+    keys = list(counts.keys())
+    n_bits = len(keys[0])
+    weights = np.fromiter((counts[key] for key in keys), dtype=np.float64,
+                          count=len(keys))
+
+    #Parse all bitstrings at once as a (shots, n_bits) matrix of 0/1 values
+    chars = np.frombuffer(''.join(keys).encode('ascii'), dtype=np.uint8)
+    bits = (chars.reshape(len(keys), n_bits) - ord('0')).astype(np.uint64)
+
+    shifts = np.arange(n_bits - 1, -1, -1, dtype=np.uint64)
+    states = (bits << shifts).sum(axis=1, dtype=np.uint64)
+
+    return states, weights, n_bits
+
+def unpack_bits(states, n_bits, lsb_first = False):
+    """
+    Parameters:
+        states : numpy array - Bitstrings packed as unsigned integers
+        n_bits : int - Length of the measured bitstrings
+        lsb_first : bool - If true, column k holds the k-th last character of
+                    the bitstring instead of the k-th character
+
+    Returns:
+        bits : numpy array - (len(states), n_bits) matrix of 0/1 values
+    """
+
+    if lsb_first:
+        shifts = np.arange(n_bits, dtype=np.uint64)
+    else:
+        shifts = np.arange(n_bits - 1, -1, -1, dtype=np.uint64)
+
+    return ((states[:, None] >> shifts) & np.uint64(1)).astype(np.int8)
+
+def maxcut_cost(bits, graph):
+    """
+    Parameters:
+        bits : numpy array - Matrix of measured bits, column i is node i
+        graph : list - Contains information about graph size and edge
+
+    Returns:
+        cost : numpy array - Objective (minus the cut size) per bitstring
+    """
+
+    edges = np.asarray(graph[1], dtype=np.intp).reshape(-1, 2)
+    cut = (bits[:, edges[:, 0]] ^ bits[:, edges[:, 1]]).sum(axis=1)
+
+    return -cut
+
+def dsp_neighbourhoods(graph):
+    """
+    Parameters:
+        graph : list - Contains information about graph size and edge
+
+    Returns:
+        neighbourhood : numpy array - (v, v) matrix, row i marks node i and
+                        all of its neighbours
+    """
+
+    v, edge_list = graph
+    neighbourhood = np.eye(v, dtype=np.int8)
+    for t in edge_list:
+        neighbourhood[t[0], t[1]] = 1
+        neighbourhood[t[1], t[0]] = 1
+
+    return neighbourhood
+
+def dsp_cost(bits, graph, neighbourhood = None):
+    """
+    Parameters:
+        bits : numpy array - Matrix of measured bits, column i is node i
+        graph : list - Contains information about graph size and edge
+        neighbourhood : numpy array - Optional precomputed dsp_neighbourhoods
+
+    Returns:
+        cost : numpy array - Objective (minus dominated sets plus unused
+               nodes) per bitstring
+    """
+
+    v = graph[0]
+    if neighbourhood is None:
+        neighbourhood = dsp_neighbourhoods(graph)
+
+    bits = bits[:, :v].astype(np.int32)
+    T = ((bits @ neighbourhood.T) > 0).sum(axis=1)
+    D = v - bits.sum(axis=1)
+
+    return -(T + D)
+
+def tsp_coupling(graph):
+    """
+    Parameters:
+        graph : list - Contains information about graph size, adjacency and
+                distances
+
+    Returns:
+        linear : numpy array - Distance weight per qubit
+        coupling : numpy array - (m, 2) array of penalized qubit pairs
+    """
+
+    v, A, D = graph
+
+    linear = np.zeros(v*v)
+    for i in range(v):
+        for j in range(i, v):
+            linear[i + v*j] = 0.5*D[i + v*j]
+
+    coupling = [[i + j*v, j + i*v] for i in range(v) for j in range(i)]
+    coupling = np.asarray(coupling, dtype=np.intp).reshape(-1, 2)
+
+    return linear, coupling
+
+def tsp_cost(bits, graph, tables = None):
+    """
+    Parameters:
+        bits : numpy array - Matrix of measured bits, column i is qubit i
+        graph : list - Contains information about graph size, adjacency and
+                distances
+        tables : tuple - Optional precomputed tsp_coupling
+
+    Returns:
+        cost : numpy array - Route cost including penalties per bitstring
+    """
+
+    if tables is None:
+        tables = tsp_coupling(graph)
+    linear, coupling = tables
+
+    bits = bits[:, :len(linear)]
+    spins = 1 - 2*bits[:, coupling].astype(np.int32)
+
+    return bits @ linear - 5*(spins[:, :, 0]*spins[:, :, 1]).sum(axis=1)
+
+def expectation(cost, weights):
+    """
+    Parameters:
+        cost : numpy array - Cost per bitstring
+        weights : numpy array - Number of measurements per bitstring
+
+    Returns:
+        expectation : float - Weighted average cost
+    """
+
+    return float(np.dot(cost, weights)/weights.sum())
+
+def score_states(problem, states, n_bits, graph):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        states : numpy array - Bitstrings packed as unsigned integers
+        n_bits : int - Length of the measured bitstrings
+        graph : list - Contains information about graph size and edge
+
+    Returns:
+        cost : numpy array - Cost per bitstring
+    """
+
+    if(problem == 'maxcut'):
+        return maxcut_cost(unpack_bits(states, n_bits), graph)
+    elif(problem == 'DSP'):
+        return dsp_cost(unpack_bits(states, n_bits), graph)
+    elif(problem == 'TSP'):
+        return tsp_cost(unpack_bits(states, n_bits), graph)
+
+    raise ValueError('Unknown problem set: '+str(problem))
+
+def cost_diagonal(problem, graph, n_bits, block_size = 2**16):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        graph : list - Contains information about graph size and edge
+        n_bits : int - Number of measured qubits
+        block_size : int - Number of basis states scored at once
+
+    Returns:
+        diagonal : numpy array - Cost of every measured basis state, indexed
+                   by the bitstring read as a binary number
+    """
+
+    diagonal = np.empty(2**n_bits)
+    for lo in range(0, 2**n_bits, block_size):
+        hi = min(lo + block_size, 2**n_bits)
+        states = np.arange(lo, hi, dtype=np.uint64)
+        diagonal[lo:hi] = score_states(problem, states, n_bits, graph)
+
+    return diagonal
+
+def exact_expectation(probs, diagonal):
+    """
+    Parameters:
+        probs : numpy array - Probability per measured basis state
+        diagonal : numpy array - Cost per measured basis state
+
+    Returns:
+        expectation : float - Exact expectation value of the cost
+    """
+
+    return float(np.dot(probs, diagonal))
@@ -1,172 +1,326 @@
 """
 Extra gate set to expand the basic XACC compiler set with higher level gates.
-All extra gates return a circuit as a string for the required qubits. This 
-string can be compiled using the XACC XASM compiler.
+All extra gates append their instructions for the required qubits to a shared
+Circuit buffer, which is serialized once to a string that can be compiled 
+using the XACC XASM compiler. Without a buffer, a gate returns its circuit as
+an XASM string.
+
+Rotation angles can either be numbers or symbolic Parameter objects. The 
+latter are used to build parametric circuit templates that are compiled once 
+and evaluated for new values of beta and gamma.
 
 """
 from math import pi, acos, sqrt
+from numbers import Number
 
-def crz(theta, q0, q1):
+class Parameter:
+    """
+    Symbolic rotation angle of the form coef*name, where name is a kernel 
+    argument of the compiled XASM circuit (e.g. beta0 or gamma0).
+    """
+    
+    def __init__(self, name, coef=1.0):
+        self.name = name
+        self.coef = coef
+        
+    def __mul__(self, other):
+        return Parameter(self.name, self.coef*other)
+    
+    __rmul__ = __mul__
     
-    circuit = "//CRZ: \n"
+    def __truediv__(self, other):
+        return Parameter(self.name, self.coef/other)
     
-    circuit += ('Rz(q[%i], %f); \n' % (q1, theta/2))
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q1))
-    circuit += ('Rz(q[%i], %f); \n' % (q1, -theta/2))
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q1))   
+    def __neg__(self):
+        return Parameter(self.name, -self.coef)
     
-    return circuit
+    def __str__(self):
+        return '%f*%s' % (self.coef, self.name)
     
+    def bind(self, values):
+        """
+        Parameters:
+            values : dict - Numerical value for each parameter name
+            
+        Returns:
+            angle : float - Evaluated rotation angle
+        """
+        return self.coef*values[self.name]
 
-def rxx(theta, q0, q1):
+def angle(theta):
+    """
+    Format a numeric or symbolic rotation angle as XASM argument
+    """
+    if isinstance(theta, Number):
+        return '%f' % theta
+    return str(theta)
+
+class Circuit:
+    """
+    Shared instruction buffer. Gates are stored as (gate, qubits, angle) 
+    tuples and only serialized to XASM once, avoiding quadratic string 
+    concatenation for large circuits.
+    """
+    
+    def __init__(self):
+        self.instructions = []
+        
+    def add(self, gate, qubits, theta=None):
+        self.instructions.append((gate, qubits, theta))
+        
+    def comment(self, text):
+        self.instructions.append(('//', (), text))
+        
+    def extend(self, other):
+        self.instructions.extend(other.instructions)
+        
+    def gates(self):
+        """
+        Returns:
+            instructions : list - All instructions except comments
+        """
+        return [inst for inst in self.instructions if inst[0] != '//']
+    
+    def counts(self):
+        """
+        Returns:
+            counts : dict - Number of instructions per gate, without comments
+        """
+        counts = {}
+        for gate, qubits, theta in self.gates():
+            counts[gate] = counts.get(gate, 0) + 1
+        return counts
+        
+    def to_xasm(self):
+        """
+        Returns:
+            circuit : string - XASM instructions of the circuit
+        """
+        lines = []
+        for gate, qubits, theta in self.instructions:
+            if gate == '//':
+                lines.append('//%s: \n' % theta)
+            else:
+                args = ', '.join('q[%i]' % q for q in qubits)
+                if theta is not None:
+                    args += ', ' + angle(theta)
+                lines.append('%s(%s); \n' % (gate, args))
+        
+        return ''.join(lines)
     
-    circuit = "//RXX: \n"
+    __str__ = to_xasm
+
+def _result(out, circuit):
+    #Return the XASM string if no shared buffer was given
+    return out.to_xasm() if circuit is None else out
+
+def crz(theta, q0, q1, circuit=None):
     
-    circuit += ('H(q[%i]); \n' % q0)
-    circuit += ('H(q[%i]); \n' % q1)
+    out = Circuit() if circuit is None else circuit
+    out.comment('CRZ')
     
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q1))
-    circuit += ('Rz(q[%i], %f); \n' % (q1, theta))
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q1))
+    out.add('Rz', (q1,), theta/2)
+    out.add('CX', (q0, q1))
+    out.add('Rz', (q1,), -theta/2)
+    out.add('CX', (q0, q1))
     
-    circuit += ('H(q[%i]); \n' % q0)
-    circuit += ('H(q[%i]); \n' % q1)    
+    return _result(out, circuit)
     
-    return circuit
 
-def ryy(theta, q0, q1):
+def rxx(theta, q0, q1, circuit=None):
     
-    circuit = "//RYY: \n"
+    out = Circuit() if circuit is None else circuit
+    out.comment('RXX')
     
-    circuit += ('Rx(q[%i], %f); \n' % (q0, pi/2))
-    circuit += ('Rx(q[%i], %f); \n' % (q1, pi/2))
+    out.add('H', (q0,))
+    out.add('H', (q1,))
     
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q1))
-    circuit += ('Rz(q[%i], %f); \n' % (q1, theta))
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q1))
+    out.add('CX', (q0, q1))
+    out.add('Rz', (q1,), theta)
+    out.add('CX', (q0, q1))
     
-    circuit += ('Rx(q[%i], %f); \n' % (q0, -pi/2))
-    circuit += ('Rx(q[%i], %f); \n' % (q1, -pi/2))
+    out.add('H', (q0,))
+    out.add('H', (q1,))
     
-    return circuit
+    return _result(out, circuit)
 
-def rzz(theta, q0, q1):
+def ryy(theta, q0, q1, circuit=None):
+    
+    out = Circuit() if circuit is None else circuit
+    out.comment('RYY')
     
-    circuit = "//RZZ: \n"
+    out.add('Rx', (q0,), pi/2)
+    out.add('Rx', (q1,), pi/2)
     
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q1))
-    circuit += ('Rz(q[%i], %f); \n' % (q1, theta))
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q1))
+    out.add('CX', (q0, q1))
+    out.add('Rz', (q1,), theta)
+    out.add('CX', (q0, q1))
     
-    return circuit
+    out.add('Rx', (q0,), -pi/2)
+    out.add('Rx', (q1,), -pi/2)
+    
+    return _result(out, circuit)
 
-def toffoli(q0, q1, q2):
+def rzz(theta, q0, q1, circuit=None):
     
-    circuit = "//toffoli: \n"
+    out = Circuit() if circuit is None else circuit
+    out.comment('RZZ')
     
-    circuit += ('H(q[%i]); \n' % q2)
-    circuit += ('CX(q[%i], q[%i]); \n' % (q1, q2))
-    circuit += ('Rz(q[%i], %f);' % (q2, -pi/4)) #Tdg
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q2))
-    circuit += ('Rz(q[%i], %f);' % (q2, pi/4)) #T
-    circuit += ('CX(q[%i], q[%i]); \n' % (q1, q2))
-    circuit += ('Rz(q[%i], %f);' % (q2, -pi/4)) #Tdg
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q2))
-    circuit += ('Rz(q[%i], %f);' % (q1, pi/4)) #T
-    circuit += ('Rz(q[%i], %f);' % (q2, pi/4)) #T
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q1))
-    circuit += ('H(q[%i]); \n' % q2)
-    circuit += ('Rz(q[%i], %f);' % (q0, pi/4)) #T
-    circuit += ('Rz(q[%i], %f);' % (q1, -pi/4))#Tdg
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q1))
+    out.add('CX', (q0, q1))
+    out.add('Rz', (q1,), theta)
+    out.add('CX', (q0, q1))
     
-    return circuit
+    return _result(out, circuit)
+
+def toffoli(q0, q1, q2, circuit=None):
+    
+    out = Circuit() if circuit is None else circuit
+    out.comment('toffoli')
+    
+    out.add('H', (q2,))
+    out.add('CX', (q1, q2))
+    out.add('Rz', (q2,), -pi/4) #Tdg
+    out.add('CX', (q0, q2))
+    out.add('Rz', (q2,), pi/4) #T
+    out.add('CX', (q1, q2))
+    out.add('Rz', (q2,), -pi/4) #Tdg
+    out.add('CX', (q0, q2))
+    out.add('Rz', (q1,), pi/4) #T
+    out.add('Rz', (q2,), pi/4) #T
+    out.add('CX', (q0, q1))
+    out.add('H', (q2,))
+    out.add('Rz', (q0,), pi/4) #T
+    out.add('Rz', (q1,), -pi/4) #Tdg
+    out.add('CX', (q0, q1))
+    
+    return _result(out, circuit)
 
-def cry(theta, q0, q1):
+def cry(theta, q0, q1, circuit=None):
     
-    circuit = "//cry: \n"
+    out = Circuit() if circuit is None else circuit
+    out.comment('cry')
     
-    circuit += ('Ry(q[%i], %f); \n' % (q0, (pi/2)-theta/2))
-    circuit += ('CX(q[%i], q[%i]); \n' % (q1, q0))
-    circuit += ('Ry(q[%i], %f); \n' % (q0, -((pi/2)-theta/2)))
+    out.add('Ry', (q0,), (pi/2)-theta/2)
+    out.add('CX', (q1, q0))
+    out.add('Ry', (q0,), -((pi/2)-theta/2))
 
-    return circuit
+    return _result(out, circuit)
 
 
-def ccry(theta, q0, q1, q2):
+def ccry(theta, q0, q1, q2, circuit=None):
     
-    circuit = "//ccry: \n"
+    out = Circuit() if circuit is None else circuit
+    out.comment('ccry')
     
-    circuit += toffoli(q0, q1, q2)
-    circuit += ('Ry(q[%i], %f); \n' % (q2, -theta/2))
-    circuit += toffoli(q0, q1, q2)
-    circuit += ('Ry(q[%i], %f); \n' % (q2, theta/2))
+    toffoli(q0, q1, q2, out)
+    out.add('Ry', (q2,), -theta/2)
+    toffoli(q0, q1, q2, out)
+    out.add('Ry', (q2,), theta/2)
         
-    return circuit
+    return _result(out, circuit)
 
 
-def scs(n, k, qbits):
+def scs(n, k, qbits, circuit=None):
     
-    circuit = "//scs: \n"
+    out = Circuit() if circuit is None else circuit
+    out.comment('scs')
     
-    circuit += ('CX(q[%i], q[%i]); \n' % (qbits[n-2], qbits[n-1]))
+    out.add('CX', (qbits[n-2], qbits[n-1]))
     theta = 2 * (acos(sqrt(1 / n)))
-    circuit += cry(theta, qbits[n-2], qbits[n-1])
-    circuit += ('CX(q[%i], q[%i]); \n' % (qbits[n-2], qbits[n-1]))
+    cry(theta, qbits[n-2], qbits[n-1], out)
+    out.add('CX', (qbits[n-2], qbits[n-1]))
     
     for m in range(k-1):
         
         control = n-2-m
-        circuit += ('CX(q[%i], q[%i]); \n' % (qbits[control-1], qbits[n-1]))
+        out.add('CX', (qbits[control-1], qbits[n-1]))
         theta = 2 * (acos(sqrt((n-control) / n)))
-        circuit += ccry(theta, qbits[n-1], qbits[control], qbits[control-1])
+        ccry(theta, qbits[n-1], qbits[control], qbits[control-1], out)
         
-        circuit += ('CX(q[%i], q[%i]); \n' % (qbits[control-1], qbits[n-1]))        
+        out.add('CX', (qbits[control-1], qbits[n-1]))
     
-    return circuit
+    return _result(out, circuit)
 
 
-def dicke_init(n, k, qbits):
+def dicke_init(n, k, qbits, circuit=None):
     #deterministic  Dicke state preparation (Bärtschi & Eidenbenz, 2019)
     #unoptimized version
     
-    circuit = "//Dicke: \n"
+    out = Circuit() if circuit is None else circuit
+    out.comment('Dicke')
     
     for x in range(n-k, n):
-        circuit += ('X(q[%i]); \n' % qbits[x])
+        out.add('X', (qbits[x],))
     
     for i in range(n, k, -1):
-        circuit += scs(i, k, qbits[0:i])
+        scs(i, k, qbits[0:i], out)
     
     for i in range(k, 1, -1):
-        circuit += scs(i, i-1, qbits[0:i])
+        scs(i, i-1, qbits[0:i], out)
         
-    return circuit  
+    return _result(out, circuit)
 
-def OR_2q(q0, q1, q2):
+def OR_2q(q0, q1, q2, circuit=None):
+    #q2 = q0 OR q1 for q2 in |0>, q0 and q1 are left unchanged
     
-    circuit = "//OR_2q: \n"
+    out = Circuit() if circuit is None else circuit
+    out.comment('OR_2q')
     
-    circuit += toffoli(q0, q1, q2)
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q1))
-    circuit += ('CX(q[%i], q[%i]); \n' % (q0, q2))
+    toffoli(q0, q1, q2, out)
+    out.add('CX', (q0, q2))
+    out.add('CX', (q1, q2))
     
-    return circuit
+    return _result(out, circuit)
 
-def OR_nrz(n, gamma, qbits):
+def OR_nrz(n, gamma, qbits, circuit=None):
+    #Phase exp(i*gamma) if the OR of the n qubits qbits[0:n] is 1, using the 
+    #n-1 ancillas qbits[n:2n-1] in |0>, which are uncomputed afterwards
     
-    circuit = "//OR_nrz: \n"
+    out = Circuit() if circuit is None else circuit
+    out.comment('OR_nrz')
     
-    circuit += OR_2q(qbits[0], qbits[1], qbits[n])
+    if n == 1:
+        out.add('Rz', (qbits[0],), gamma)
+        return _result(out, circuit)
+    
+    OR_2q(qbits[0], qbits[1], qbits[n], out)
     
     for i in range(2, n):
-        circuit += OR_2q(qbits[i], qbits[n+i-2], qbits[n+i-1])
+        OR_2q(qbits[i], qbits[n+i-2], qbits[n+i-1], out)
+    
+    out.add('Rz', (qbits[2*n-2],), gamma)
     
-    circuit += crz(gamma, 2*n-2, 2*n-1)
+    for i in range(n-1, 1, -1):
+        OR_2q(qbits[i], qbits[n+i-2], qbits[n+i-1], out)
     
-    for i in range(n, 2, -1):
-        circuit += OR_2q(qbits[n-i-1], qbits[2*n-2-i], qbits[2*n-1-i])
+    OR_2q(qbits[0], qbits[1], qbits[n], out)
     
-    circuit += OR_2q(qbits[0], qbits[1], qbits[n])
+    return _result(out, circuit)
+
+def OR_phase(n, gamma, qbits, circuit=None):
+    #Phase exp(i*gamma) if the OR of the n qubits qbits[0:n] is 1 (up to a 
+    #global phase), without ancillas. The OR phase expands into rotations of 
+    #gamma/2^(n-1) on the parities of all 2^n - 1 qubit subsets, which are 
+    #accumulated on each target qubit in Gray code order of the qubits below 
+    #it: 2^n - 1 Rz and 2^n - 2 CX gates. OR_nrz needs 16(n-1) CX, so this is
+    #only cheaper for n <= 6
+    
+    out = Circuit() if circuit is None else circuit
+    out.comment('OR_phase')
+    
+    theta = gamma/2**(n-1)
+    
+    for k in range(n):
+        target = qbits[k]
+        out.add('Rz', (target,), theta)
+        
+        for j in range(1, 2**k):
+            #Gray code j differs from j-1 in the lowest set bit of j
+            flip = (j & -j).bit_length() - 1
+            out.add('CX', (qbits[flip], target))
+            out.add('Rz', (target,), theta)
+        
+        if k > 0:
+            out.add('CX', (qbits[k-1], target))
     
-    return circuit
\ No newline at end of file
+    return _result(out, circuit)
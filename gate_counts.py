@@ -0,0 +1,111 @@
+"""
+Project: QAOA Benchmarks XACC platform
+Description: Gate count reports of the generated QAOA circuits per graph size,
+             before compilation. Simulation time and memory grow with the
+             number of qubits (2^n statevector) and gates, so the reports show
+             the effect of alternative circuit syntheses, such as the OR
+             oracle of the DSP cost unitary (see QAOA.genDSPCircuit), and the
+             gates saved by the peephole optimizer (see circuit_optimizer.py).
+"""
+
+import QAOA as qaoa
+import scheduler as sched
+import circuit_optimizer as co
+
+#Initial state and layer functions per problem
+LAYERS = {'maxcut' : (qaoa.initMaxcut, qaoa.layerMaxcut),
+          'TSP' : (qaoa.initTSP, qaoa.layerTSP),
+          'DSP' : (qaoa.initDSP, qaoa.layerDSP)}
+
+def circuit_counts(circuit, n_qbits):
+    """
+    Parameters:
+        circuit : Circuit - Generated circuit
+        n_qbits : int - Number of allocated qubits
+
+    Returns:
+        counts : dict - Number of qubits, gates (without measurements) and CX
+                 gates of the circuit
+    """
+
+    counts = circuit.counts()
+    counts.pop('Measure', None)
+
+    return {'qubits' : n_qbits, 'gates' : sum(counts.values()), 'CX' : counts.get('CX', 0)}
+
+def dsp_report(sizes, p = 1, syntheses = ('chain', 'gray', 'auto')):
+    """
+    Parameters:
+        sizes : list - Graph sizes of the DSP problem set
+        p : int - Iterations used in QAOA circuit generation
+        syntheses : list - OR oracle syntheses to compare
+
+    Returns:
+        report : list - (size, synthesis, counts) per size and synthesis
+    """
+
+    report = []
+    params = [1.0]*2*p
+    for size in sizes:
+        graph = sched.make_graph('DSP', size)
+        for synthesis in syntheses:
+            circuit = qaoa.buildLayers('DSP', graph, params, qaoa.initDSP,
+                                       qaoa.DSP_LAYERS[synthesis])
+            n_qbits = qaoa.problemQubits('DSP', graph, synthesis)
+            report.append((size, synthesis, circuit_counts(circuit, n_qbits)))
+
+    return report
+
+def optimizer_report(problem, sizes, p = 1, template = True):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        sizes : list - Graph sizes of the problem set
+        p : int - Iterations used in QAOA circuit generation
+        template : bool - If true, count the symbolic circuit template, 
+                   otherwise a numerical circuit of the default parameters
+
+    Returns:
+        report : list - (size, variant, counts) per size, for the 'generated' 
+                 and 'optimized' circuit and the gates 'saved'
+    """
+
+    report = []
+    params = qaoa.templateParams(p) if template else [1.0]*2*p
+    initFunc, layerFunc = LAYERS[problem]
+    for size in sizes:
+        graph = sched.make_graph(problem, size)
+        circuit = qaoa.buildLayers(problem, graph, params, initFunc, layerFunc)
+        n_qbits = qaoa.problemQubits(problem, graph)
+
+        before = circuit_counts(circuit, n_qbits)
+        after = circuit_counts(co.optimize(circuit), n_qbits)
+        saved = {key : before[key] - after[key] for key in before}
+        saved['qubits'] = n_qbits
+        report += [(size, 'generated', before), (size, 'optimized', after), (size, 'saved', saved)]
+
+    return report
+
+def format_report(title, report):
+    lines = [title, '  %-6s %-10s %8s %10s %10s' % ('size', 'variant', 'qubits', 'gates', 'CX')]
+    for size, variant, counts in report:
+        lines.append('  %-6i %-10s %8i %10i %10i'
+                     % (size, variant, counts['qubits'], counts['gates'], counts['CX']))
+
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    
+    import main
+    
+    #Compare the DSP OR oracle syntheses for the benchmark graph sizes
+    for problem, graph_sizes in main.problem_set:
+        if(problem == 'DSP'):
+            for p in main.p_values:
+                print(format_report('DSP OR oracle synthesis, p=%i' % p, dsp_report(graph_sizes, p)))
+    
+    #Gates saved by the peephole optimizer per problem and size
+    for problem, graph_sizes in main.problem_set:
+        for p in main.p_values:
+            print(format_report('Peephole optimizer: %s, p=%i' % (problem, p), 
+                                optimizer_report(problem, graph_sizes, p)))
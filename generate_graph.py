@@ -54,11 +54,11 @@ def include_all(n, r):
 
 
 # returns the problem graph where every edge has a set probability
-def set_probability(n, p):
+def set_probability(n, p, rng = random):
     edges = []
     for i in range(n-1):
         for j in range(i+1, n):
-            if random.random() < p:
+            if rng.random() < p:
                 edges.append([i, j])
     return [n, edges]
 
@@ -91,18 +91,19 @@ def fully_connected(n):
     return [n, edges]
 
 # transforms the graph to a weighted graph with edge value inf for disconnected vertices
-def tsp_problem_set(n, method, *arg):
+def tsp_problem_set(n, method, *arg, rng = random):
     if len(arg) == 1:
         p = arg[0]
-        edge_list = method(n, p)
+        [n, edge_list] = method(n, p)
     else:
-        edge_list = method(n)
+        [n, edge_list] = method(n)
+    edge_list = [sorted(edge[:2]) for edge in edge_list]
     [n, full_list] = fully_connected(n)
     for i in range(len(full_list)):
         if full_list[i] not in edge_list:
             full_list[i].append(50)
         else:
-            full_list[i].append(random.randrange(1, 10, 1))
+            full_list[i].append(rng.randrange(1, 10, 1))
     e = full_list
     A = [[0 for x in range(n)] for x in range(n)]
     D = [[0 for x in range(n)] for x in range(n)]
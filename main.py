@@ -11,14 +11,11 @@ Description: This program collects runtime data for different QPU simulator
                  - Dominating set problem
 """
 
-import QAOA as qaoa
 #import exact_solver as exact #Currently not used for benchmarking
-import generate_graph as gg
-import xacc
+import scheduler as sched
+import results_store as rs
 import runtime_plots as plot
-import pickle
-from os import listdir
-from os.path import isfile, join
+import bench_stats as bs
 
 """"BENCHMARK PARAMETERS TO EDIT """
 # Get access to the desired QPU and
@@ -27,91 +24,120 @@ qpu_ids = ['ibm:ibmq_qasm_simulator',
            'ionq', 
            'aer', 
            'qsim', 
-           'qpp'
+           'qpp',
+           'native' #Built-in NumPy statevector simulator
            ]
 
 #Setup QAOA circuit parameters
-#Set of graph sizes for problems (>15 qbits takes long time for local simulators, 2n for DSP and n^2 for TSP)
+#Set of graph sizes for problems (>15 qbits takes long time for local simulators, n for DSP and n^2 for TSP)
 problem_set = [
                ['maxcut', [5 ,7, 9, 11, 13, 15, 17, 19]], #, 21, 23, 25]], #ionq crash at 21
                ['DSP', [3, 5, 7, 9, 11, 13]], #, 15, 17, 19]], #QPP 11 takes long time at 11, IonQ crash at 17
                ['TSP', [2, 3, 4]]# , 5]] #IonQ crash at 5
                ] #maxcut, TSP, DSP  
 
-p = 1  #Increasing p usually improves QAOA score, but also drastically incraeses simulation time
+#Depths p to sweep. Increasing p usually improves QAOA score, but also drastically 
+#incraeses simulation time
+p_values = [1]
 
-"""END OF EDIT"""
+#Classical optimizer: 'COBYLA', 'L-BFGS-B', 'ADAM', 'SPSA' or 'GRID' (gradient 
+#based optimizers use threads_per_job parallel circuit executions on the native backend)
+optimizer = 'COBYLA'
+
+#Submit all circuits of one optimizer step as a single job (reduces queue 
+#round-trips for remote backends, not used by COBYLA)
+batch = False
+
+#OR oracle of the DSP cost unitary: 'gray' (Gray code phase rotations, no 
+#ancillas), 'chain' (Toffoli OR chain into max degree ancillas) or 'auto' 
+#(per neighbourhood the one with fewer CX gates)
+dsp_synthesis = 'auto'
+
+#Cancel and merge redundant gates of the generated circuits before compilation
+peephole = True
+
+#Optimize exact expectation values instead of sampled shots (native backend only)
+exact = False
+
+#Scheduler settings: number of worker processes (None uses all cores) and 
+#simulator threads per job
+workers = None
+threads_per_job = 1
 
-#Get list of acquired data
-data_list = [f for f in listdir("./data") if isfile(join("./data", f))]
+#Trace the build, compile, execute and score stages of every job, exported as 
+#Chrome trace JSON to ./data/traces
+trace = False
 
-for problem, graph_sizes  in problem_set:
+#Repeated benchmark mode: runs per configuration, each on a random graph 
+#instance drawn with its own seed, reported as median and confidence interval. 
+#Warmup runs per worker are discarded (repetitions = 1 runs every 
+#configuration once on the regular graph)
+repetitions = 1
+warmup = 0
+
+#Start every run from the optimized parameters of the nearest solved graph size of
+#the same backend and repetition (or interpolated from p-1), instead of [1.0]*2p
+warm_start = False
+
+"""END OF EDIT"""
+
+if __name__ == '__main__':
     
-    for qpu_id in qpu_ids:             
-        
-        #Declare empty runtime list and start simulations
-        runtimes_list = []    
-        print("Start "+str(qpu_id)+" simulations:")
-        for size in graph_sizes:
-            
-            #Run ID
-            num_str = '0'+str(size) if size < 10 else str(size)
-            run_id = str(problem)+'-'+str(qpu_id)+'-size-'+num_str+'-p'+str(p)
-            
-            #Check if data is allready available
-            
-            if run_id not in data_list:  
-                
-                #Configure accelerator
-                qpu = xacc.getAccelerator(qpu_id, {'shots' : 2048})  
-            
-                #Genererate appropriate graph for problem set
-                if(problem !='TSP'):
-                    graph = gg.regular_graph(size)
-                    #plot.draw_graph(graph)
-                else:
-                    graph = gg.tsp_problem_set(size, gg.regular_graph)    
-                    #TODO: DRAW network            
-                
-                #Run QAOA algorithm
-                qaoa_result, job_runtimes = qaoa.runQAOA(qpu, qpu_id, graph, problem, p, False) #List of 8 best solutions & average runtime
-                
-                #Fix ibm errors
-                if qpu_id[0:3] == 'ibm':
-                    for i in range(len(job_runtimes)):
-                        if job_runtimes[i] == 0:
-                            job_runtimes[i] = (job_runtimes[i-1] + job_runtimes[i+1])/2
-                            #TODO: Fix edge cases
-                        
-                
-                #Print & store results
-                print("QAOA: ", qaoa_result)
-                #runtimes_list.append(job_runtimes)
-        
-                #Store results
-                with open('./data/'+run_id, "wb") as fp:
-                    pickle.dump(job_runtimes, fp)
+    #Import legacy pickled results into the results store
+    store = rs.ResultsStore('./data/results.sqlite')
+    store.import_pickles('./data')
+    
+    #Run all benchmark jobs without stored data on the process pool
+    jobs = sched.expand_jobs(problem_set, qpu_ids, p_values, store, repetitions)
+    print("Start "+str(len(jobs))+" benchmark jobs:")
+    qaoa_options = {'exact' : exact, 'optimizer' : optimizer, 'workers' : threads_per_job, 
+                    'batch' : batch, 'synthesis' : dsp_synthesis,
+                    'peephole' : peephole}
+    sched.run_jobs(jobs, store, workers, threads_per_job, qaoa_options = qaoa_options, trace = trace,
+                   warmup = warmup, warm_start = warm_start)
+    
+    for p in p_values:
         
-        #backend_runtimes.append(runtimes_list)
+        for problem, graph_sizes  in problem_set:
         
-    #Retrieve stored data
-    data_list = sorted([f for f in listdir("./data") if isfile(join("./data", f))])
-    backend_runtimes = []
-    for qpu_id in qpu_ids:        
-        runtimes_list = []
-        for filename in data_list:
-            index = filename.split('-')
-            if (index[0] == problem and index[1] == qpu_id and int(index[3]) in graph_sizes):                
-                runtimes_list.append(pickle.load(open('./data/'+filename, "rb")))
-        backend_runtimes.append(runtimes_list)
+            #Retrieve stored data
+            if repetitions == 1:
+                backend_runtimes = store.backend_runtimes(problem, qpu_ids, graph_sizes, p)
+            else:
+                backend_runtimes = store.backend_repetitions(problem, qpu_ids, graph_sizes, p)
+            
+                #Report total QAOA runtime statistics over the repetitions
+                for qpu_id, (found, runs_list) in zip(qpu_ids, backend_runtimes):
+                    for size, runs in zip(found, runs_list):
+                        name = sched.get_run_id(problem, qpu_id, size, p) + ' total [s]'
+                        print(bs.format_summary(name, bs.run_statistics(runs)['total']))
     
-    #Plot results        
-    title = "Benchmark: " + str(problem) +" problem, p="+str(p)
-    plot.lineplot_results(backend_runtimes, graph_sizes, title, qpu_ids)
+            #Plot results        
+            title = "Benchmark: " + str(problem) +" problem, p="+str(p)
+            plot.lineplot_results(backend_runtimes, graph_sizes, title, qpu_ids)
     
-    #Store final results
-    with open("data_"+str(problem)+"_p"+str(p), "wb") as fp:
-        pickle.dump(backend_runtimes, fp)
+            #Plot optimizer convergence for the largest graph size
+            histories = []
+            for qpu_id in qpu_ids:
+                repetition = None if repetitions == 1 else 0
+                runtimes, expectations = store.iterations(sched.get_run_id(problem, qpu_id, graph_sizes[-1], 
+                                                                           p, repetition))
+                histories.append(([e for e in expectations if e is not None], runtimes))
+            title = "Convergence: " + str(problem) +" problem, n="+str(graph_sizes[-1])+", p="+str(p)
+            plot.convergence_plot(histories, title, qpu_ids)
         
-print("Benchmarking finished!")
-
+            #Plot solution quality against the exact optimum
+            backend_metrics = {metric : store.backend_metrics(problem, qpu_ids, graph_sizes, p, metric)
+                               for metric in ['approx_ratio', 'p_opt', 'tts']}
+            title = "Quality: " + str(problem) +" problem, p="+str(p)
+            plot.lineplot_metrics(backend_metrics, title, qpu_ids)
+    
+    #Plot runtime scaling in p for the largest graph size
+    if len(p_values) > 1:
+        for problem, graph_sizes in problem_set:
+            backend_runtimes = store.backend_depth_runtimes(problem, qpu_ids, graph_sizes[-1], p_values,
+                                                            repetitions > 1)
+            title = "Depth: " + str(problem) +" problem, n="+str(graph_sizes[-1])
+            plot.lineplot_results(backend_runtimes, p_values, title, qpu_ids, xlabel = "p")
+        
+    print("Benchmarking finished!")
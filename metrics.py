@@ -0,0 +1,116 @@
+"""
+Project: QAOA Benchmarks XACC platform
+Description: Solution quality metrics of a QAOA run next to the raw runtime.
+             The final expectation value is compared to the exact optimum of
+             the problem graph (see exact_solver.OptimumCache, for TSP the
+             best feasible route, which is not compared), the measured
+             probability mass on optimal bitstrings gives the success
+             probability of a single run, from which the time-to-solution
+             follows as the runtime times the number of repetitions needed
+             for a 99% chance of sampling an optimal solution.
+"""
+
+from math import ceil, log, inf
+
+#Success probability targeted by the time-to-solution
+TARGET = 0.99
+
+def solution_key(problem, key, nodes):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        key : string - Measured bitstring in the XACC counts format
+        nodes : int - Graph size
+
+    Returns:
+        solution : string - Bitstring in exact solver order, character k is
+                   node (or TSP qubit) k
+    """
+
+    if(problem == 'DSP'):
+        return key[:nodes]
+    elif(problem == 'TSP'):
+        return key[:nodes**2]
+
+    return key
+
+def optimal_probability(problem, counts, nodes, optimal):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        counts : dict - Number of measurements per qubit bitstring
+        nodes : int - Graph size
+        optimal : list - Optimal bitstrings from the exact solver
+
+    Returns:
+        p_opt : float - Fraction of the measurements that are optimal
+    """
+
+    optimal = set(optimal)
+    shots = sum(counts.values())
+    hits = sum(n for key, n in counts.items()
+               if solution_key(problem, key, nodes) in optimal)
+
+    return hits/shots if shots else 0.0
+
+def approximation_ratio(expectation, optimum):
+    """
+    Parameters:
+        expectation : float - Final expectation value (minimized objective)
+        optimum : float - Exact minimum of the objective over all bitstrings
+
+    Returns:
+        ratio : float - Expectation over optimum, 1 is optimal. Only defined
+                for negative optima (maxcut, DSP), None otherwise
+    """
+
+    if optimum < 0:
+        return expectation/optimum
+
+    return None
+
+def time_to_solution(runtime, p_opt, target = TARGET):
+    """
+    Parameters:
+        runtime : float - Runtime of a single QAOA run
+        p_opt : float - Probability of sampling an optimal solution
+        target : float - Targeted probability of success
+
+    Returns:
+        tts : float - Runtime of the repetitions needed to reach the target,
+              inf if no optimal solution was measured
+    """
+
+    if p_opt <= 0:
+        return inf
+    elif p_opt >= target:
+        return runtime
+
+    return runtime*ceil(log(1 - target)/log(1 - p_opt))
+
+def run_metrics(problem, graph, counts, expectation, job_runtimes, optimum, optimal):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        graph : list - Contains information about graph size and edge
+        counts : dict - Measurement counts of the optimized circuit
+        expectation : float - Expectation value of the optimized circuit
+        job_runtimes : list - All job runtimes for the QAOA optimization
+        optimum : float - Exact minimum of the objective
+        optimal : list - Optimal bitstrings from the exact solver
+
+    Returns:
+        metrics : dict - expectation, approx_ratio (None for TSP), p_opt and 
+                  tts (in ms, using the total QAOA runtime of the run)
+    """
+
+    p_opt = optimal_probability(problem, counts, graph[0], optimal)
+
+    #The TSP optimum is the best route, infeasible bitstrings have a lower 
+    #cost (e.g. the all-zero state), so there is no approximation ratio
+    ratio = None if problem == 'TSP' else approximation_ratio(expectation, optimum)
+
+    return {'expectation' : expectation,
+            'approx_ratio' : ratio,
+            'p_opt' : p_opt,
+            'tts' : time_to_solution(sum(job_runtimes), p_opt)}
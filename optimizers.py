@@ -0,0 +1,177 @@
+"""
+Project: QAOA Benchmarks XACC platform
+Description: Pluggable classical optimizers for QAOA. Next to the gradient
+             free scipy COBYLA optimizer, gradient based optimizers are
+             available that use parameter-shift gradients:
+                 - L-BFGS-B (scipy)
+                 - ADAM
+                 - SPSA (simultaneous perturbation, two circuits per step)
+                 - GRID (grid search warm-start followed by COBYLA)
+             All shifted circuits of a single optimizer step are evaluated as
+             one batch, so backends can execute them in parallel.
+             The two-term shift rule with shift pi/2 is only exact for an
+             angle entering a single rotation gate. QAOA shares beta and gamma
+             over all edges and qubits (a shift of pi/2 on the maxcut mixer
+             flips all bits and yields a zero gradient), therefore a small
+             default shift is used, turning the rule into a central
+             difference with the same 4p circuits per gradient.
+"""
+
+import numpy as np
+from math import sin
+from scipy.optimize import minimize as scipy_minimize, OptimizeResult
+
+#Default parameter shift, see module description
+SHIFT = 0.1
+
+METHODS = ['COBYLA', 'L-BFGS-B', 'ADAM', 'SPSA', 'GRID']
+
+def parameter_shift_gradient(batch_fun, x, shift = SHIFT):
+    """
+    Parameters:
+        batch_fun : function - Evaluates the objective for a list of points
+        x : numpy array - Parameters beta and gamma
+        shift : float - Parameter shift
+
+    Returns:
+        gradient : numpy array - Parameter-shift estimate of the gradient
+    """
+
+    x = np.asarray(x, dtype=float)
+    points = []
+    for k in range(len(x)):
+        e_k = np.zeros(len(x))
+        e_k[k] = shift
+        points += [x + e_k, x - e_k]
+
+    #All 2*len(x) = 4p shifted circuits are submitted as one batch
+    values = np.asarray(batch_fun(points))
+
+    return (values[0::2] - values[1::2])/(2*sin(shift))
+
+def adam(fun, batch_fun, x0, maxiter = 250, lr = 0.05, beta1 = 0.9, beta2 = 0.999,
+         eps = 1e-8, gtol = 1e-4, shift = SHIFT):
+    """
+    Parameters:
+        fun : function - Objective function
+        batch_fun : function - Evaluates the objective for a list of points
+        x0 : list - Initial parameters
+        maxiter : int - Maximum number of optimizer steps
+        lr, beta1, beta2, eps : float - ADAM hyperparameters
+        gtol : float - Stop when the gradient norm drops below gtol
+        shift : float - Parameter shift used for the gradient
+
+    Returns:
+        result : OptimizeResult - Optimizer result
+    """
+
+    x = np.asarray(x0, dtype=float)
+    m = np.zeros(len(x))
+    v = np.zeros(len(x))
+    nfev = 0
+
+    for it in range(1, maxiter + 1):
+        g = parameter_shift_gradient(batch_fun, x, shift)
+        nfev += 2*len(x)
+        if np.linalg.norm(g) < gtol:
+            break
+
+        m = beta1*m + (1 - beta1)*g
+        v = beta2*v + (1 - beta2)*g**2
+        m_hat = m/(1 - beta1**it)
+        v_hat = v/(1 - beta2**it)
+        x = x - lr*m_hat/(np.sqrt(v_hat) + eps)
+
+    return OptimizeResult(x = x, fun = fun(x), nit = it, nfev = nfev + 1,
+                          success = True, message = 'ADAM finished')
+
+def spsa(fun, batch_fun, x0, maxiter = 250, a = 0.2, c = 0.1, A = 10,
+         alpha = 0.602, gamma = 0.101, seed = None):
+    """
+    Parameters:
+        fun : function - Objective function
+        batch_fun : function - Evaluates the objective for a list of points
+        x0 : list - Initial parameters
+        maxiter : int - Maximum number of optimizer steps
+        a, c, A, alpha, gamma : float - SPSA gain sequence parameters
+        seed : int - Seed for the random perturbations
+
+    Returns:
+        result : OptimizeResult - Optimizer result
+    """
+
+    rng = np.random.default_rng(seed)
+    x = np.asarray(x0, dtype=float)
+
+    for k in range(maxiter):
+        a_k = a/(k + 1 + A)**alpha
+        c_k = c/(k + 1)**gamma
+        delta = rng.choice([-1.0, 1.0], size = len(x))
+
+        f_plus, f_minus = batch_fun([x + c_k*delta, x - c_k*delta])
+        x = x - a_k*(f_plus - f_minus)/(2*c_k*delta)
+
+    return OptimizeResult(x = x, fun = fun(x), nit = maxiter, nfev = 2*maxiter + 1,
+                          success = True, message = 'SPSA finished')
+
+def grid_start(batch_fun, p, resolution = 4):
+    """
+    Parameters:
+        batch_fun : function - Evaluates the objective for a list of points
+        p : int - Iterations used in QAOA circuit generation
+        resolution : int - Grid points per parameter, beta in [0, pi) and 
+                     gamma in [0, 2pi)
+
+    Returns:
+        x0 : numpy array - Best grid point
+        nfev : int - Number of evaluated grid points
+    """
+
+    beta = np.arange(resolution)*np.pi/resolution
+    gamma = np.arange(resolution)*2*np.pi/resolution
+    axes = [beta]*p + [gamma]*p
+    points = np.stack(np.meshgrid(*axes, indexing = 'ij'), axis = -1).reshape(-1, 2*p)
+
+    #The whole grid is evaluated as a single batch
+    values = batch_fun(list(points))
+
+    return points[int(np.argmin(values))], len(points)
+
+def minimize(fun, x0, method = 'COBYLA', batch_fun = None, maxiter = 250,
+             shift = SHIFT, options = {}):
+    """
+    Parameters:
+        fun : function - Objective function
+        x0 : list - Initial parameters
+        method : string - One of METHODS
+        batch_fun : function - Evaluates the objective for a list of points,
+                    defaults to evaluating fun point by point
+        maxiter : int - Maximum number of optimizer steps
+        shift : float - Parameter shift used for gradients
+        options : dict - Additional optimizer specific settings
+
+    Returns:
+        result : OptimizeResult - Optimizer result
+    """
+
+    if batch_fun is None:
+        batch_fun = lambda points: [fun(x) for x in points]
+
+    if(method == 'COBYLA'):
+        return scipy_minimize(fun, x0, method = 'COBYLA',
+                              options = dict({'maxiter': maxiter}, **options))
+    elif(method == 'L-BFGS-B'):
+        jac = lambda x: parameter_shift_gradient(batch_fun, x, shift)
+        return scipy_minimize(fun, x0, jac = jac, method = 'L-BFGS-B',
+                              options = dict({'maxiter': maxiter}, **options))
+    elif(method == 'ADAM'):
+        return adam(fun, batch_fun, x0, maxiter, shift = shift, **options)
+    elif(method == 'SPSA'):
+        return spsa(fun, batch_fun, x0, maxiter, **options)
+    elif(method == 'GRID'):
+        x0, nfev = grid_start(batch_fun, len(x0)//2, **options)
+        result = scipy_minimize(fun, x0, method = 'COBYLA', options = {'maxiter': maxiter})
+        result.nfev += nfev
+        return result
+
+    raise ValueError('Unknown optimizer: '+str(method))
@@ -0,0 +1,58 @@
+"""
+Project: QAOA Benchmarks XACC platform
+Description: Warm starts of the classical optimizer. Optimized QAOA angles
+             concentrate across instances of similar size, so the parameters
+             stored for the nearest solved graph size (same problem, p,
+             backend and repetition) are a good starting point for the next
+             size. A run at depth p+1 is seeded by linearly interpolating the
+             depth p solution (INTERP, Zhou et al., PRX 10, 021067). Without
+             stored parameters the default initial point [1.0]*2p is used.
+"""
+
+import numpy as np
+
+def default_params(p):
+    return [1.0]*2*p
+
+def interp(params):
+    """
+    Parameters:
+        params : list - Parameters beta and gamma of depth p
+
+    Returns:
+        params : list - INTERP parameters beta and gamma of depth p+1
+    """
+
+    p = len(params)//2
+    new = []
+    for angles in (params[:p], params[p:]):
+        padded = np.concatenate(([0.0], angles, [0.0]))
+        i = np.arange(1, p + 2)
+        new += list((i - 1)/p*padded[i - 1] + (p - i + 1)/p*padded[i])
+
+    return new
+
+def initial_params(store, problem, size, p, backend, repetition = None):
+    """
+    Parameters:
+        store : ResultsStore - Store with optimized parameters of earlier runs
+        problem : string - Problem set (maxcut, TSP, DSP)
+        size : int - Graph size
+        p : int - Iterations used in QAOA circuit generation
+        backend : string - QPU backend
+        repetition : int - Repetition of the run, None for single runs
+
+    Returns:
+        params : list - Initial parameters beta and gamma
+        source : string - Origin of the parameters, for logging
+    """
+
+    #Parameters of the nearest size at depth p, or else at the largest lower depth
+    for q in range(p, 0, -1):
+        found, params = store.nearest_params(problem, size, q, backend, repetition)
+        if params is not None:
+            for k in range(q, p):
+                params = interp(params)
+            return params, 'size %i, p=%i' % (found, q)
+
+    return default_params(p), 'default'
@@ -0,0 +1,310 @@
+"""
+Project: QAOA Benchmarks XACC platform
+Description: Asyncio layer for remote (IBM and IonQ) backends. Remote job
+             runtimes are not looked up after every optimizer step: the job
+             identifiers are recorded in a RuntimeLedger during the run and
+             their timing metadata is fetched concurrently once the run has
+             finished. Complete runs on remote backends are executed on an
+             event loop next to the local process pool, so the queue waits of
+             different backends and graph sizes overlap. The blocking XACC,
+             qiskit and HTTP calls run in worker threads (asyncio.to_thread)
+             bounded by a semaphore. API base URLs are configurable, such that
+             a local mock server can stand in for the IonQ and IBM APIs.
+             IonQ runtimes of a run are retrieved with a single listing call
+             on a pooled HTTP session, matched by job id. IBM jobs are
+             retrieved concurrently with retries from a cached backend.
+             Missing runtimes are interpolated in a single place.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+#IonQ REST API, overridden by the IONQ_API_URL environment variable
+IONQ_URL = os.environ.get('IONQ_API_URL', 'https://api.ionq.co/v0.1')
+#IonQ credentials, overridden by the IONQ_CONFIG environment variable
+IONQ_CONFIG = os.environ.get('IONQ_CONFIG', os.path.expanduser('~/.ionq_config'))
+
+def is_remote(qpu_id):
+    return qpu_id[0:3] == 'ibm' or qpu_id == 'ionq'
+
+async def gather_limited(calls, concurrency = 8):
+    """
+    Parameters:
+        calls : list - Blocking functions without arguments
+        concurrency : int - Maximum number of calls running at once
+
+    Returns:
+        results : list - Result per call, or the raised exception
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(call):
+        async with semaphore:
+            return await asyncio.to_thread(call)
+
+    return await asyncio.gather(*[run(call) for call in calls], return_exceptions = True)
+
+@lru_cache(maxsize = None)
+def ionq_key(config):
+    """
+    Parameters:
+        config : string - IonQ config file with a 'key: <api key>' line
+
+    Returns:
+        key : string - API key, read once per process
+    """
+
+    with open(config) as file:
+        return file.readline().split(':')[1].strip()
+
+class IonQClient:
+    """
+    Runtime lookups of IonQ jobs through the REST API, over a single
+    keep-alive connection pool.
+    """
+
+    def __init__(self, config = IONQ_CONFIG, base_url = IONQ_URL, concurrency = 8, 
+                 page_size = 100):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = 'apiKey '+str(ionq_key(config))
+
+    def job_id(self, buffer):
+        return buffer.getInformation().get('ionq-job-id')
+
+    def get(self, path, params = None):
+        response = self.session.get(self.base_url+path, params = params)
+        response.raise_for_status()
+        return response.json()
+
+    def recent_jobs(self, n):
+        """
+        Parameters:
+            n : int - Number of jobs to list
+
+        Returns:
+            jobs : list - The n most recent jobs of the account, newest first
+        """
+
+        jobs = []
+        params = {'limit' : min(n, self.page_size)}
+        while len(jobs) < n:
+            page = self.get('/jobs', params)
+            jobs += page.get('jobs', [])
+            if not page.get('next') or not page.get('jobs'):
+                break
+            params = {'limit' : min(n - len(jobs), self.page_size), 'next' : page['next']}
+
+        return jobs[:n]
+
+    def runtime(self, job_id):
+        return self.get('/jobs/'+str(job_id)).get('execution_time')
+
+    def runtimes(self, job_ids):
+        """
+        Parameters:
+            job_ids : list - IonQ job identifiers, in order of submission, 
+                      None if the backend did not report it
+
+        Returns:
+            runtimes : list - Execution time per job in ms, None if unknown
+        """
+
+        #One listing call covers the jobs of a run in the common case
+        jobs = self.recent_jobs(len(job_ids))
+        listed = {job.get('id') : job.get('execution_time') for job in jobs}
+
+        runtimes = [listed.get(job_id) for job_id in job_ids]
+        if None in job_ids:
+            #Concurrent runs share the account, so jobs without an id can not
+            #be matched to the listing and are left to fill_missing
+            print("IonQ job id of "+str(job_ids.count(None))+" jobs not reported, "
+                  "runtimes unknown")
+
+        #Jobs outside of the listing are looked up by id
+        missing = [k for k, job_id in enumerate(job_ids) if job_id is not None 
+                   and runtimes[k] is None]
+        calls = [lambda job_id = job_ids[k]: self.runtime(job_id) for k in missing]
+        results = asyncio.run(gather_limited(calls, self.concurrency)) if calls else []
+        for k, r in zip(missing, results):
+            runtimes[k] = None if isinstance(r, Exception) else r
+
+        return runtimes
+
+def step_runtime(times):
+    """
+    Parameters:
+        times : dict - IBM job timestamps per status (time_per_step)
+
+    Returns:
+        runtime : float - Time between RUNNING and COMPLETED in ms, None if 
+                  either timestamp is missing
+    """
+
+    t_complete = times.get('COMPLETED')
+    t_run = times.get('RUNNING')
+    if t_complete is None or t_run is None: #Sometimes, complete time is not retreived properly
+        return None
+
+    return (t_complete - t_run).total_seconds()*1000 #s to ms
+
+class IBMClient:
+    """
+    Runtime lookups of IBM jobs through the qiskit provider. The backend 
+    object is retrieved once and jobs are retrieved concurrently with retries.
+    """
+
+    def __init__(self, provider, qpu_id, concurrency = 8, retries = 3, delay = 1.0):
+        self.provider = provider
+        self.backend_name = qpu_id[4:]
+        self.concurrency = concurrency
+        self.retries = retries
+        self.delay = delay
+        self._backend = None
+        self.lock = threading.Lock()
+
+    def job_id(self, buffer):
+        return buffer.getInformation().get('ibm-job-id')
+
+    def backend(self):
+        with self.lock:
+            if self._backend is None:
+                self._backend = self.provider.get_backend(self.backend_name)
+            return self._backend
+
+    def runtime(self, job_id):
+        """
+        Parameters:
+            job_id : string - IBM job identifier
+
+        Returns:
+            runtime : float - Runtime of the job in ms, None if unknown
+        """
+
+        for attempt in range(self.retries + 1):
+            try:
+                times = self.backend().retrieve_job(job_id).time_per_step()
+                return step_runtime(times)
+            except Exception as error:
+                if attempt == self.retries:
+                    print("IBM job "+str(job_id)+" not retrieved: ", error)
+                    return None
+                time.sleep(self.delay*2**attempt)
+
+    def runtimes(self, job_ids):
+        """
+        Parameters:
+            job_ids : list - IBM job identifiers, in order of submission
+
+        Returns:
+            runtimes : list - Runtime per job in ms, None if unknown
+        """
+
+        calls = [lambda job_id = job_id: self.runtime(job_id) for job_id in job_ids]
+        results = asyncio.run(gather_limited(calls, self.concurrency))
+
+        return [None if isinstance(r, Exception) else r for r in results]
+
+def fill_missing(job_runtimes):
+    """
+    Replace unknown (None) runtimes in place by the mean of the nearest known
+    runtimes before and after them, or by the single nearest one at the ends.
+    If no runtime is known, they are set to 0.
+    """
+
+    known = [k for k, runtime in enumerate(job_runtimes) if runtime is not None]
+    missing = len(job_runtimes) - len(known)
+    if missing == 0:
+        return
+    print("Runtime of "+str(missing)+" jobs not retrieved, interpolating")
+
+    for k in range(len(job_runtimes)):
+        if job_runtimes[k] is not None:
+            continue
+        before = [job_runtimes[j] for j in known if j < k][-1:]
+        after = [job_runtimes[j] for j in known if j > k][:1]
+        neighbours = before + after
+        job_runtimes[k] = sum(neighbours)/len(neighbours) if neighbours else 0
+
+class RuntimeLedger:
+    """
+    Job identifiers of a remote run, whose runtimes are resolved in bulk at
+    the end of the run.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.entries = []
+        self.lock = threading.Lock()
+
+    def record(self, job_runtimes, buffer, circuits = 1):
+        """
+        Reserve the runtime slots of a job in job_runtimes.
+
+        Parameters:
+            job_runtimes : list - List to store job runtimes
+            buffer : XACC AcceleratorBuffer Object - Buffer of the executed job
+            circuits : int - Number of circuits in the job, its runtime is
+                       divided over them
+        """
+
+        with self.lock:
+            start = len(job_runtimes)
+            job_runtimes.extend([None]*circuits)
+            self.entries.append((self.client.job_id(buffer), start, circuits))
+
+    def resolve(self, job_runtimes):
+        """
+        Fetch the runtimes of all recorded jobs and fill them in job_runtimes.
+        Runtimes that could not be retrieved are interpolated (fill_missing).
+        """
+
+        if not self.entries:
+            return
+
+        runtimes = self.client.runtimes([job_id for job_id, start, circuits in self.entries])
+        for (job_id, start, circuits), runtime in zip(self.entries, runtimes):
+            if runtime is not None:
+                job_runtimes[start:start + circuits] = [runtime/circuits]*circuits
+
+        fill_missing(job_runtimes)
+
+        self.entries = []
+
+class RemoteRunner:
+    """
+    Event loop in a background thread executing blocking remote runs
+    concurrently. Submitted runs return concurrent.futures.Future objects, so
+    they can be awaited together with the futures of the local process pool.
+    """
+
+    def __init__(self, concurrency = 8):
+        self.concurrency = concurrency
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(concurrency))
+        self.semaphore = None
+        self.thread = threading.Thread(target = self.loop.run_forever, daemon = True)
+        self.thread.start()
+
+    async def run(self, fn, args):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self.semaphore:
+            return await asyncio.to_thread(fn, *args)
+
+    def submit(self, fn, *args):
+        return asyncio.run_coroutine_threadsafe(self.run(fn, args), self.loop)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
@@ -0,0 +1,401 @@
+"""
+Project: QAOA Benchmarks XACC platform
+Description: Append-only benchmark results store in a single SQLite file.
+             Every QAOA run is stored with indexed problem, backend, size and
+             p columns, next to one row per optimizer iteration holding the
+             job runtime and expectation value. Plotting and analysis are a
+             single indexed query instead of a directory walk over pickle
+             files with fragile filename parsing. Runs also store solution
+             quality metrics (see metrics.py) of the optimized circuit and
+             the repetition number in the repeated benchmark mode. The
+             optimized parameters of every run are kept for warm starts of
+             later runs (see param_transfer.py).
+"""
+
+import os
+import re
+import json
+import time
+import pickle
+import sqlite3
+import numpy as np
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    problem TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    p INTEGER NOT NULL,
+    created REAL NOT NULL,
+    expectation REAL,
+    approx_ratio REAL,
+    p_opt REAL,
+    tts REAL,
+    repetition INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_lookup ON runs (problem, backend, size, p);
+CREATE TABLE IF NOT EXISTS iterations (
+    run_id TEXT NOT NULL REFERENCES runs (run_id),
+    iteration INTEGER NOT NULL,
+    runtime REAL,
+    expectation REAL,
+    PRIMARY KEY (run_id, iteration)
+);
+CREATE TABLE IF NOT EXISTS params (
+    run_id TEXT PRIMARY KEY REFERENCES runs (run_id),
+    problem TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    p INTEGER NOT NULL,
+    params TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS params_lookup ON params (problem, p, size);
+'''
+
+#Per run metrics
+METRICS = ['expectation', 'approx_ratio', 'p_opt', 'tts']
+
+#Columns added to stores created before they existed
+ADDED_COLUMNS = {metric : 'REAL' for metric in METRICS}
+ADDED_COLUMNS['repetition'] = 'INTEGER'
+
+#Legacy pickle filenames: <problem>-<qpu_id>-size-<size>-p<p>, qpu_id may contain '-'
+LEGACY_NAME = re.compile(r'^(maxcut|DSP|TSP)-(.+)-size-(\d+)-p(\d+)$')
+
+class ResultsStore:
+    """
+    SQLite backed store of benchmark runs and their per-iteration results.
+    """
+
+    def __init__(self, path = './data/results.sqlite'):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+        self.conn = sqlite3.connect(path, timeout = 60)
+        self.conn.executescript(SCHEMA)
+
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(runs)')]
+        with self.conn:
+            for column, kind in ADDED_COLUMNS.items():
+                if column not in columns:
+                    self.conn.execute('ALTER TABLE runs ADD COLUMN %s %s' % (column, kind))
+
+    def close(self):
+        self.conn.close()
+
+    def has_run(self, run_id):
+        row = self.conn.execute('SELECT 1 FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        return row is not None
+
+    def add_run(self, run_id, problem, backend, size, p, job_runtimes, history = None,
+                metrics = None, repetition = None, params = None):
+        """
+        Parameters:
+            run_id : string - Identifier of the run
+            problem : string - Problem set (maxcut, TSP, DSP)
+            backend : string - QPU backend
+            size : int - Graph size
+            p : int - Iterations used in QAOA circuit generation
+            job_runtimes : list - Runtime per optimizer iteration in ms
+            history : list - Expectation value per optimizer iteration
+            metrics : dict - Solution quality metrics, see metrics.run_metrics
+            repetition : int - Repetition in the repeated benchmark mode
+            params : list - Optimized parameters beta and gamma
+
+        Returns:
+            none
+        """
+
+        if history is None:
+            history = [None]*len(job_runtimes)
+        if metrics is None:
+            metrics = {}
+
+        with self.conn:
+            self.conn.execute('INSERT INTO runs (run_id, problem, backend, size, p, created, repetition, %s) '
+                              'VALUES (?, ?, ?, ?, ?, ?, ?, %s)' % (', '.join(METRICS), ', '.join('?'*len(METRICS))),
+                              (run_id, problem, backend, size, p, time.time(), repetition,
+                               *[metrics.get(metric) for metric in METRICS]))
+            self.conn.executemany('INSERT INTO iterations VALUES (?, ?, ?, ?)',
+                                  [(run_id, it, runtime, expectation) for it, (runtime, expectation)
+                                   in enumerate(zip(job_runtimes, history))])
+            if params is not None:
+                self.conn.execute('INSERT INTO params VALUES (?, ?, ?, ?, ?, ?)',
+                                  (run_id, problem, backend, size, p, 
+                                   json.dumps([float(x) for x in params])))
+
+    def nearest_params(self, problem, size, p, backend, repetition = None):
+        """
+        Parameters:
+            problem : string - Problem set (maxcut, TSP, DSP)
+            size : int - Graph size
+            p : int - Iterations used in QAOA circuit generation
+            backend : string - QPU backend
+            repetition : int - Repetition of the run, None for single runs
+
+        Returns:
+            size : int - Graph size of the nearest stored parameters of the 
+                   same backend and repetition, None if no parameters for 
+                   problem and p are stored
+            params : list - Optimized parameters beta and gamma
+        """
+
+        #Only runs of the same backend and repetition, so repetitions stay 
+        #independent and seeding does not depend on which job finished first
+        row = self.conn.execute('SELECT t.size, t.params FROM params t '
+                                'JOIN runs r ON r.run_id = t.run_id '
+                                'WHERE t.problem = ? AND t.p = ? AND t.backend = ? '
+                                'AND r.repetition IS ? '
+                                'ORDER BY abs(t.size - ?), t.size < ? DESC LIMIT 1',
+                                (problem, p, backend, repetition, size, size)).fetchone()
+        if row is None:
+            return None, None
+
+        return row[0], json.loads(row[1])
+
+    def iterations(self, run_id):
+        """
+        Parameters:
+            run_id : string - Identifier of the run
+
+        Returns:
+            runtimes : list - Runtime per optimizer iteration in ms
+            expectations : list - Expectation value per optimizer iteration
+        """
+
+        rows = self.conn.execute('SELECT runtime, expectation FROM iterations '
+                                 'WHERE run_id = ? ORDER BY iteration', (run_id,)).fetchall()
+
+        return [r[0] for r in rows], [r[1] for r in rows]
+
+    def runtimes(self, problem, backend, sizes, p):
+        """
+        Parameters:
+            problem : string - Problem set (maxcut, TSP, DSP)
+            backend : string - QPU backend
+            sizes : list - Graph sizes
+            p : int - Iterations used in QAOA circuit generation
+
+        Returns:
+            sizes : list - Graph sizes with stored results, ascending
+            runtimes_list : list - Job runtimes per stored graph size
+        """
+
+        marks = ','.join('?'*len(sizes))
+        rows = self.conn.execute('SELECT r.size, i.runtime FROM runs r '
+                                 'JOIN iterations i ON i.run_id = r.run_id '
+                                 'WHERE r.problem = ? AND r.backend = ? AND r.p = ? '
+                                 'AND r.size IN (%s) AND r.repetition IS NULL '
+                                 'ORDER BY r.size, i.iteration' % marks,
+                                 (problem, backend, p, *sizes)).fetchall()
+
+        found = []
+        runtimes_list = []
+        for size, runtime in rows:
+            if not found or found[-1] != size:
+                found.append(size)
+                runtimes_list.append([])
+            runtimes_list[-1].append(runtime)
+
+        return found, runtimes_list
+
+    def repetitions(self, problem, backend, sizes, p):
+        """
+        Parameters:
+            problem : string - Problem set (maxcut, TSP, DSP)
+            backend : string - QPU backend
+            sizes : list - Graph sizes
+            p : int - Iterations used in QAOA circuit generation
+
+        Returns:
+            sizes : list - Graph sizes with stored results, ascending
+            runs_list : list - Job runtimes of every repeated run per stored 
+                        graph size
+        """
+
+        marks = ','.join('?'*len(sizes))
+        rows = self.conn.execute('SELECT r.size, r.run_id, i.runtime FROM runs r '
+                                 'JOIN iterations i ON i.run_id = r.run_id '
+                                 'WHERE r.problem = ? AND r.backend = ? AND r.p = ? '
+                                 'AND r.size IN (%s) AND r.repetition IS NOT NULL '
+                                 'ORDER BY r.size, r.repetition, i.iteration' % marks,
+                                 (problem, backend, p, *sizes)).fetchall()
+
+        found = []
+        runs_list = []
+        last_run = None
+        for size, run_id, runtime in rows:
+            if not found or found[-1] != size:
+                found.append(size)
+                runs_list.append([])
+            if run_id != last_run:
+                runs_list[-1].append([])
+                last_run = run_id
+            runs_list[-1][-1].append(runtime)
+
+        return found, runs_list
+
+    def backend_repetitions(self, problem, qpu_ids, sizes, p):
+        """
+        Parameters:
+            problem : string - Problem set (maxcut, TSP, DSP)
+            qpu_ids : list - QPU backends
+            sizes : list - Graph sizes
+            p : int - Iterations used in QAOA circuit generation
+
+        Returns:
+            backend_repetitions : list - (sizes, runs_list) per backend, the 
+                                  stored graph sizes and the job runtimes per
+                                  size and repetition, as used by 
+                                  runtime_plots.lineplot_results
+        """
+
+        return [self.repetitions(problem, qpu_id, sizes, p) for qpu_id in qpu_ids]
+
+    def depth_runtimes(self, problem, backend, size, p_values, repeated = False):
+        """
+        Parameters:
+            problem : string - Problem set (maxcut, TSP, DSP)
+            backend : string - QPU backend
+            size : int - Graph size
+            p_values : list - Iterations used in QAOA circuit generation
+            repeated : bool - If true, use the runs of the repeated benchmark
+                       mode instead of the single runs
+
+        Returns:
+            p_values : list - Depths p with stored results, ascending
+            runtimes_list : list - Job runtimes per stored p, or a list of job
+                            runtimes per repetition if repeated
+        """
+
+        marks = ','.join('?'*len(p_values))
+        rows = self.conn.execute('SELECT r.p, r.run_id, i.runtime FROM runs r '
+                                 'JOIN iterations i ON i.run_id = r.run_id '
+                                 'WHERE r.problem = ? AND r.backend = ? AND r.size = ? '
+                                 'AND r.p IN (%s) AND r.repetition IS %s NULL '
+                                 'ORDER BY r.p, r.repetition, i.iteration' 
+                                 % (marks, 'NOT' if repeated else ''),
+                                 (problem, backend, size, *p_values)).fetchall()
+
+        found = []
+        runtimes_list = []
+        last_run = None
+        for p, run_id, runtime in rows:
+            if not found or found[-1] != p:
+                found.append(p)
+                runtimes_list.append([])
+            if repeated and run_id != last_run:
+                runtimes_list[-1].append([])
+                last_run = run_id
+            (runtimes_list[-1][-1] if repeated else runtimes_list[-1]).append(runtime)
+
+        return found, runtimes_list
+
+    def backend_depth_runtimes(self, problem, qpu_ids, size, p_values, repeated = False):
+        """
+        Parameters:
+            Same as depth_runtimes, for a list of qpu_ids
+
+        Returns:
+            backend_runtimes : list - (p_values, runtimes_list) per backend, the
+                               stored depths and the job runtimes per p, as 
+                               used by runtime_plots.lineplot_results
+        """
+
+        return [self.depth_runtimes(problem, qpu_id, size, p_values, repeated) 
+                for qpu_id in qpu_ids]
+
+    def backend_runtimes(self, problem, qpu_ids, sizes, p):
+        """
+        Parameters:
+            problem : string - Problem set (maxcut, TSP, DSP)
+            qpu_ids : list - QPU backends
+            sizes : list - Graph sizes
+            p : int - Iterations used in QAOA circuit generation
+
+        Returns:
+            backend_runtimes : list - (sizes, runtimes_list) per backend, the 
+                               stored graph sizes and the job runtimes per 
+                               size, as used by runtime_plots.lineplot_results
+        """
+
+        return [self.runtimes(problem, qpu_id, sizes, p) for qpu_id in qpu_ids]
+
+    def metric(self, problem, backend, sizes, p, metric):
+        """
+        Parameters:
+            problem : string - Problem set (maxcut, TSP, DSP)
+            backend : string - QPU backend
+            sizes : list - Graph sizes
+            p : int - Iterations used in QAOA circuit generation
+            metric : string - One of METRICS
+
+        Returns:
+            sizes : list - Graph sizes with stored results, ascending
+            values : list - Metric value per stored graph size, the median 
+                     over repetitions
+        """
+
+        if metric not in METRICS:
+            raise ValueError('Unknown metric: '+str(metric))
+
+        marks = ','.join('?'*len(sizes))
+        rows = self.conn.execute('SELECT size, %s FROM runs '
+                                 'WHERE problem = ? AND backend = ? AND p = ? '
+                                 'AND size IN (%s) ORDER BY size' % (metric, marks),
+                                 (problem, backend, p, *sizes)).fetchall()
+
+        found = []
+        values = []
+        for size, value in rows:
+            if not found or found[-1] != size:
+                found.append(size)
+                values.append([])
+            if value is not None:
+                values[-1].append(value)
+
+        return found, [float(np.median(v)) if v else None for v in values]
+
+    def backend_metrics(self, problem, qpu_ids, sizes, p, metric):
+        """
+        Parameters:
+            problem : string - Problem set (maxcut, TSP, DSP)
+            qpu_ids : list - QPU backends
+            sizes : list - Graph sizes
+            p : int - Iterations used in QAOA circuit generation
+            metric : string - One of METRICS
+
+        Returns:
+            backend_metrics : list - (sizes, values) per backend, as used by 
+                              runtime_plots.lineplot_metrics
+        """
+
+        return [self.metric(problem, qpu_id, sizes, p, metric) for qpu_id in qpu_ids]
+
+    def import_pickles(self, data_dir = './data'):
+        """
+        Import legacy pickled job runtimes (and histories) from data_dir.
+
+        Parameters:
+            data_dir : string - Directory with pickle files per run_id
+
+        Returns:
+            imported : int - Number of imported runs
+        """
+
+        imported = 0
+        for filename in sorted(os.listdir(data_dir)):
+            match = LEGACY_NAME.match(filename)
+            if not match or self.has_run(filename):
+                continue
+
+            problem, backend, size, p = match.groups()
+            job_runtimes = pickle.load(open(os.path.join(data_dir, filename), "rb"))
+            history = None
+            history_file = os.path.join(data_dir, 'history', filename)
+            if os.path.isfile(history_file):
+                history = pickle.load(open(history_file, "rb"))
+
+            self.add_run(filename, problem, backend, int(size), int(p), job_runtimes, history)
+            imported += 1
+
+        return imported
@@ -11,6 +11,7 @@ import matplotlib.pyplot as plt
 import networkx as nx
 from matplotlib.ticker import FixedLocator
 import numpy as np
+import bench_stats as bs
 
 def draw_graph(g):
     """
@@ -27,13 +28,19 @@ def draw_graph(g):
     nx.draw_circular(graph, with_labels=True, alpha=0.8, node_size=500)
     
 
-def lineplot_results(backend_runtimes, graph_sizes, title, legend = []):
+def lineplot_results(backend_runtimes, graph_sizes, title, legend = [], xlabel = "Nodes"):
     """
     Parameters:
-        backend_runtimes : nested list - Runtime resuls of multiple backends
-        graph_sizes : list - sizes of graph used in benchmark
+        backend_runtimes : list - (sizes, runtimes_list) per backend, the sizes
+                           with results and either one list of job runtimes 
+                           per size or, in the repeated benchmark mode, a list
+                           of runs per size. Repeated runs are plotted as 
+                           median with a bootstrap confidence band
+        graph_sizes : list - sizes of graph used in benchmark, the x-axis ticks
         title : string - Main plot title, based on problem and p
         legend : list - qpu_ids used in benchmark
+        xlabel : string - Label of the x-axis, e.g. "p" for runtime-vs-p plots
+                 with the depths passed as graph_sizes
 
     Returns: 
         none
@@ -42,7 +49,18 @@ def lineplot_results(backend_runtimes, graph_sizes, title, legend = []):
     fig, (ax1, ax2, ax3) = plt.subplots(1, 3)
     fig.set_size_inches(8,4)
     
-    for it, runtimes_list in enumerate(backend_runtimes):
+    #Each backend is plotted against its own sizes, failed runs are missing
+    for it, (sizes, runtimes_list) in enumerate(backend_runtimes):
+        if runtimes_list and isinstance(runtimes_list[0][0], list):
+            #Repeated runs: median and confidence band per panel
+            stats = [bs.run_statistics(runs) for runs in runtimes_list]
+            for ax, key in zip((ax1, ax2, ax3), ('mean', 'iterations', 'total')):
+                line, = ax.plot(sizes, [s[key]['median'] for s in stats], marker = 'o')
+                ax.fill_between(sizes, [s[key]['ci_low'] for s in stats],
+                                [s[key]['ci_high'] for s in stats], 
+                                color = line.get_color(), alpha = 0.2)
+            continue
+        
         means = []
         iters = []
         totals = []
@@ -50,15 +68,15 @@ def lineplot_results(backend_runtimes, graph_sizes, title, legend = []):
             means.append(sum(runtimes)/len(runtimes))
             iters.append(len(runtimes))
             totals.append(sum(runtimes)/1000) #ms to s
-        ax1.plot(graph_sizes, means, marker = 'o') 
-        ax2.plot(graph_sizes, iters, marker = 'o') 
-        ax3.plot(graph_sizes, totals, marker = 'o')
+        ax1.plot(sizes, means, marker = 'o') 
+        ax2.plot(sizes, iters, marker = 'o') 
+        ax3.plot(sizes, totals, marker = 'o')
             
         #Debugging 
         if(False):
-            fit = np.polyfit(graph_sizes, np.log(iters), 2)
-            fit_line = np.exp(fit[2] + fit[1]*np.asarray(graph_sizes) + fit[0]*np.asarray(graph_sizes)**2)
-            ax2.plot(graph_sizes, fit_line, marker = 'x') 
+            fit = np.polyfit(sizes, np.log(iters), 2)
+            fit_line = np.exp(fit[2] + fit[1]*np.asarray(sizes) + fit[0]*np.asarray(sizes)**2)
+            ax2.plot(sizes, fit_line, marker = 'x') 
             if('maxcut' in title):
                 print(f'MCP - {legend[it]}: exp({fit[2]:.2f} + {fit[1]:.2f}n + {fit[0]:.2f}n^2)')
             elif('DSP' in title):
@@ -80,23 +98,23 @@ def lineplot_results(backend_runtimes, graph_sizes, title, legend = []):
     # Adding title
     fig.suptitle(title)
     ax1.set_title('Average job runtime')
-    ax1.set_xlabel("Nodes")
+    ax1.set_xlabel(xlabel)
     ax1.set_ylabel("Runtime [ms]")
     
     ax2.set_title('Optimizer iterations')
-    ax2.set_xlabel("Nodes")
+    ax2.set_xlabel(xlabel)
     ax2.set_ylabel("Iterations")
     
     ax3.set_title('Total QAOA runtime')
-    ax3.set_xlabel("Nodes")
+    ax3.set_xlabel(xlabel)
     ax3.set_ylabel("Runtime [s]")
     
     #Add legend
     legend_copy = legend.copy()
     for i, qpu in enumerate(legend_copy):
-        if qpu in ['aer', 'qsim', 'qpp']:
+        if qpu in ['aer', 'qsim', 'qpp', 'native']:
             legend_copy[i]= qpu +' (local)'
-    fig.legend(legend_copy, loc='upper center', bbox_to_anchor=(0.5, 0.05),
+    fig.legend(ax1.get_lines(), legend_copy, loc='upper center', bbox_to_anchor=(0.5, 0.05),
           fancybox=True, shadow=True, ncol=5)
      
     # Removing top axes and right axes
@@ -108,6 +126,92 @@ def lineplot_results(backend_runtimes, graph_sizes, title, legend = []):
     
     plt.savefig("plots/"+"".join(title.split(" "))+".pdf", bbox_inches='tight')
 
+def convergence_plot(histories, title, legend = []):
+    """
+    Parameters:
+        histories : list - (expectations, runtimes) per job of multiple backends
+        title : string - Main plot title, based on problem, size and p
+        legend : list - qpu_ids used in benchmark
+
+    Returns: 
+        none
+    """
+    
+    fig, (ax1, ax2) = plt.subplots(1, 2)
+    fig.set_size_inches(8,4)
+    
+    for expectations, runtimes in histories:
+        best = np.minimum.accumulate(expectations) if len(expectations) else []
+        ax1.plot(range(1, len(best)+1), best) 
+        ax2.plot(np.cumsum(runtimes[:len(best)])/1000, best) #ms to s
+    
+    ax2.set_xscale("log")
+    
+    # Adding title
+    fig.suptitle(title)
+    ax1.set_title('Convergence per job')
+    ax1.set_xlabel("Jobs")
+    ax1.set_ylabel("Best expectation")
+    
+    ax2.set_title('Convergence in time')
+    ax2.set_xlabel("Runtime [s]")
+    ax2.set_ylabel("Best expectation")
+    
+    fig.legend(legend, loc='upper center', bbox_to_anchor=(0.5, 0.05),
+          fancybox=True, shadow=True, ncol=5)
+    
+    fig.tight_layout()
+    
+    plt.savefig("plots/"+"".join(title.split(" "))+".pdf", bbox_inches='tight')
+
+def lineplot_metrics(backend_metrics, title, legend = []):
+    """
+    Parameters:
+        backend_metrics : dict - Per metric name a list of (sizes, values) per
+                          backend, see ResultsStore.backend_metrics
+        title : string - Main plot title, based on problem and p
+        legend : list - qpu_ids used in benchmark
+
+    Returns: 
+        none
+    """
+    
+    labels = {'approx_ratio' : ('Approximation ratio', 'Ratio', 'linear'),
+              'p_opt' : ('Optimal probability', 'Probability', 'linear'),
+              'tts' : ('Time-to-solution (99%)', 'Runtime [s]', 'log')}
+    
+    fig, axes = plt.subplots(1, len(backend_metrics))
+    fig.set_size_inches(8,4)
+    axes = np.atleast_1d(axes)
+    
+    for ax, (metric, backends) in zip(axes, backend_metrics.items()):
+        for sizes, values in backends:
+            values = np.array([np.nan if v is None else v for v in values], dtype=float)
+            if metric == 'tts':
+                values = values/1000 #ms to s
+            ax.plot(sizes, values, marker = 'o')
+        
+        name, ylabel, scale = labels.get(metric, (metric, metric, 'linear'))
+        ax.set_title(name)
+        ax.set_xlabel("Nodes")
+        ax.set_ylabel(ylabel)
+        ax.set_yscale(scale)
+    
+    # Adding title
+    fig.suptitle(title)
+    
+    #Add legend
+    legend_copy = legend.copy()
+    for i, qpu in enumerate(legend_copy):
+        if qpu in ['aer', 'qsim', 'qpp', 'native']:
+            legend_copy[i]= qpu +' (local)'
+    fig.legend(legend_copy, loc='upper center', bbox_to_anchor=(0.5, 0.05),
+          fancybox=True, shadow=True, ncol=5)
+    
+    fig.tight_layout()
+    
+    plt.savefig("plots/"+"".join(title.split(" "))+".pdf", bbox_inches='tight')
+
 #TODO: Update boxplots for multiple backends
 def boxplot_results(runtimes_list, graph_sizes, title):
     """
@@ -0,0 +1,296 @@
+"""
+Project: QAOA Benchmarks XACC platform
+Description: Process pool scheduler for the benchmark sweep. The grid of
+             problems, QPU backends and graph sizes is expanded into
+             independent jobs which are executed on a configurable pool of
+             worker processes. Every worker is pinned to its own set of CPU
+             cores and limits the number of simulator threads, such that
+             local simulators do not oversubscribe the machine. Results are
+             appended to the results store as soon as a job finishes.
+             In the repeated benchmark mode every configuration is run
+             several times on random graph instances, after
+             warmup runs that are not stored (see bench_stats.py). Jobs on
+             remote backends mostly wait in a queue, they run concurrently on
+             an asyncio event loop next to the pool (see remote.py).
+             With warm starts, the jobs of a problem and backend run in order
+             of p and graph size, each seeded with the parameters of the
+             nearest solved run (see param_transfer.py).
+"""
+
+import os
+import multiprocessing as mp
+import remote
+import param_transfer as pt
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from os.path import join
+
+#Environment variables used by the simulator backends to size thread pools
+THREAD_VARS = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS']
+
+#Configurations that have been warmed up in this worker process
+_warm = set()
+
+def get_run_id(problem, qpu_id, size, p, repetition = None):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        qpu_id : string - QPU backend
+        size : int - Graph size
+        p : int - Iterations used in QAOA circuit generation
+        repetition : int - Repetition of the run in the repeated benchmark 
+                     mode, None for a single run
+
+    Returns:
+        run_id : string - Identifier used to store the run results
+    """
+
+    num_str = '0'+str(size) if size < 10 else str(size)
+    run_id = str(problem)+'-'+str(qpu_id)+'-size-'+num_str+'-p'+str(p)
+    if repetition is not None:
+        run_id += '-r%02i' % repetition
+    return run_id
+
+def make_graph(problem, size, seed = None):
+    """
+    Parameters:
+        problem : string - Problem set (maxcut, TSP, DSP)
+        size : int - Graph size
+        seed : int - If given, a random graph instance is drawn with this 
+               seed, with edge probability 4/(size-1) such that the expected
+               degree equals that of the regular graph. Otherwise the regular
+               graph is used, with TSP distances drawn with seed 0
+
+    Returns:
+        graph : list - Problem graph
+    """
+
+    import random
+    import generate_graph as gg
+
+    if seed is None:
+        rng = random.Random(0)
+        method = gg.regular_graph
+    else:
+        #Local generator, remote jobs draw graphs concurrently in threads
+        rng = random.Random(seed)
+        method = lambda n: gg.set_probability(n, min(1.0, 4/max(n - 1, 1)), rng)
+
+    if(problem !='TSP'):
+        return method(size)
+
+    return gg.tsp_problem_set(size, method, rng = rng)
+
+def expand_jobs(problem_set, qpu_ids, p_values, store, repetitions = 1):
+    """
+    Parameters:
+        problem_set : list - Problems and graph sizes to benchmark
+        qpu_ids : list - QPU backends to benchmark
+        p_values : list - Iterations used in QAOA circuit generation to sweep,
+                   or a single int
+        store : ResultsStore - Store with previously acquired data
+        repetitions : int - Number of runs per configuration, repetition r 
+                      uses seed r, so all backends share the same instances
+
+    Returns:
+        jobs : list - (run_id, problem, qpu_id, size, p, repetition) for every 
+               run without stored results, largest graphs first
+    """
+
+    if isinstance(p_values, int):
+        p_values = [p_values]
+    reps = [None] if repetitions == 1 else range(repetitions)
+
+    jobs = []
+    for problem, graph_sizes in problem_set:
+        for qpu_id in qpu_ids:
+            for size in graph_sizes:
+                for p in p_values:
+                    for repetition in reps:
+                        run_id = get_run_id(problem, qpu_id, size, p, repetition)
+                        if not store.has_run(run_id):
+                            jobs.append((run_id, problem, qpu_id, size, p, repetition))
+
+    #Start with the longest jobs to balance the load over the pool
+    jobs.sort(key = lambda job: (job[3], job[4]), reverse = True)
+
+    return jobs
+
+def run_job(job, data_dir = './data', shots = 2048, qaoa_options = {}, trace = False,
+            warmup = 0):
+    """
+    Parameters:
+        job : tuple - (run_id, problem, qpu_id, size, p, repetition)
+        data_dir : string - Directory to store cached cost tables and optima
+        shots : int - Number of shots per circuit execution
+        qaoa_options : dict - Additional keyword arguments for runQAOA
+        trace : bool - If true, trace the stages of every job and export the 
+                spans to data_dir/traces/<run_id>.json (see tracing.py)
+        warmup : int - Number of discarded runs before the first run of a 
+                 configuration in this worker
+
+    Returns:
+        run_id : string - Identifier of the finished run
+        qaoa_result : list - 8 best bitstring QAOA results
+        job_runtimes : list - All job runtimes for the QAOA optimization
+        history : list - Expectation value per job
+        run_metrics : dict - Solution quality metrics, see metrics.run_metrics
+        params : list - Optimized parameters beta and gamma
+    """
+
+    #Import in the worker, after thread limits have been configured
+    import QAOA as qaoa
+    import cost_cache
+    import exact_solver
+    import metrics
+    import tracing
+
+    #Share precomputed cost tables between workers and repeated sweeps
+    cost_cache.cache.cache_dir = join(data_dir, 'cost_cache')
+    exact_solver.cache.cache_dir = join(data_dir, 'exact')
+
+    run_id, problem, qpu_id, size, p, repetition = job
+
+    #Configure accelerator
+    qpu = qaoa.getAccelerator(qpu_id, shots, repetition)
+
+    #Genererate appropriate graph for problem set
+    graph = make_graph(problem, size, repetition)
+
+    #Warm up imports, compilers and caches, results are discarded
+    if (problem, qpu_id, size, p) not in _warm:
+        for w in range(warmup):
+            qaoa.runQAOA(qpu, qpu_id, graph, problem, p, False, **qaoa_options)
+        _warm.add((problem, qpu_id, size, p))
+
+    #Run QAOA algorithm
+    if trace:
+        tracing.start(run_id)
+    info = {}
+    try:
+        qaoa_result, job_runtimes = qaoa.runQAOA(qpu, qpu_id, graph, problem, p, False,
+                                                 info = info, **qaoa_options)
+    finally:
+        tracer = tracing.stop()
+    if tracer is not None:
+        tracer.export(join(data_dir, 'traces', run_id + '.json'))
+        print(tracer.format_summary())
+
+    #Compare the optimized circuit to the exact optimum
+    optimum, optimal = exact_solver.cache.get(problem, graph)
+    run_metrics = metrics.run_metrics(problem, graph, info['counts'], info['expectation'],
+                                      job_runtimes, optimum, optimal)
+
+    return run_id, qaoa_result, job_runtimes, info['history'], run_metrics, info['params']
+
+def _init_worker(cpu_slices, threads):
+    """
+    Pool initializer: pin the worker to a free CPU slice and limit the number
+    of threads the simulators may spawn.
+    """
+
+    for var in THREAD_VARS:
+        os.environ[var] = str(threads)
+
+    if cpu_slices is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpu_slices.get())
+
+def run_jobs(jobs, store, workers = None, threads_per_job = 1, pin_cpus = True,
+             data_dir = './data', shots = 2048, qaoa_options = {}, trace = False, warmup = 0,
+             remote_concurrency = 8, warm_start = False):
+    """
+    Parameters:
+        jobs : list - Jobs created by expand_jobs
+        store : ResultsStore - Store the results are appended to
+        workers : int - Number of worker processes, defaults to the number of
+                  available cores divided by threads_per_job
+        threads_per_job : int - Number of simulator threads per job
+        pin_cpus : bool - If true, pin every worker to its own cores
+        data_dir : string - Directory to store cached cost tables and optima
+        shots : int - Number of shots per circuit execution
+        qaoa_options : dict - Additional keyword arguments for runQAOA
+        trace : bool - If true, export a trace of every run, see run_job
+        warmup : int - Number of discarded warmup runs, see run_job
+        remote_concurrency : int - Number of remote jobs running at once, 
+                             remote jobs run in threads of this process and 
+                             are not traced (the tracer is process global)
+        warm_start : bool - If true, the jobs of every problem, backend and 
+                     repetition run in order of p and size, each starting 
+                     from the parameters of the nearest solved run of the
+                     same backend and repetition in store
+
+    Returns:
+        results : dict - (qaoa_result, job_runtimes) per run_id
+    """
+
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count()))
+        pin_cpus = False
+
+    if workers is None:
+        workers = max(1, len(cpus)//threads_per_job)
+    remote_jobs = [job for job in jobs if remote.is_remote(job[2])]
+    jobs = [job for job in jobs if not remote.is_remote(job[2])]
+    workers = max(1, min(workers, len(jobs)))
+
+    #Fresh interpreters, so thread limits are set before simulators load
+    ctx = mp.get_context('spawn')
+
+    cpu_slices = None
+    if pin_cpus and workers*threads_per_job <= len(cpus):
+        cpu_slices = ctx.Queue()
+        for w in range(workers):
+            cpu_slices.put(set(cpus[w*threads_per_job:(w+1)*threads_per_job]))
+
+    results = {}
+    runner = remote.RemoteRunner(remote_concurrency)
+    with ProcessPoolExecutor(max_workers = workers, mp_context = ctx,
+                             initializer = _init_worker,
+                             initargs = (cpu_slices, threads_per_job)) as pool:
+
+        def submit(job):
+            run_id, problem, qpu_id, size, p, repetition = job
+            options = qaoa_options
+            if warm_start:
+                initParams, source = pt.initial_params(store, problem, size, p, qpu_id, repetition)
+                options = dict(qaoa_options, initParams = initParams)
+                print("Warm start "+run_id+" from "+source)
+            
+            #Remote queue waits overlap with each other and with the local jobs
+            if remote.is_remote(qpu_id):
+                return runner.submit(run_job, job, data_dir, shots, options, False, warmup)
+            return pool.submit(run_job, job, data_dir, shots, options, trace, warmup)
+        
+        #Every chain of jobs runs in order, chains run in parallel
+        if warm_start:
+            chains = {}
+            for job in sorted(jobs + remote_jobs, key = lambda job: (job[4], job[3])):
+                chains.setdefault((job[1], job[2], job[5]), []).append(job)
+            chains = list(chains.values())
+        else:
+            chains = [[job] for job in jobs + remote_jobs]
+        
+        futures = {submit(chain[0]) : chain for chain in chains}
+        while futures:
+            finished, pending = wait(futures, return_when = FIRST_COMPLETED)
+            for future in finished:
+                chain = futures.pop(future)
+                run_id, problem, qpu_id, size, p, repetition = chain.pop(0)
+                
+                try:
+                    run_id, qaoa_result, job_runtimes, history, run_metrics, params = future.result()
+                except Exception as error:
+                    print("Failed "+run_id+": ", error)
+                else:
+                    #Results are written by the main process only
+                    store.add_run(run_id, problem, qpu_id, size, p, job_runtimes, history, 
+                                  run_metrics, repetition, params)
+                    print("Finished "+run_id+", QAOA: ", qaoa_result)
+                    results[run_id] = (qaoa_result, job_runtimes)
+                
+                if chain:
+                    futures[submit(chain[0])] = chain
+    runner.close()
+
+    return results
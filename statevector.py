@@ -0,0 +1,276 @@
+"""
+Project: QAOA Benchmarks XACC platform
+Description: Native NumPy statevector simulator backend. It mimics the parts
+             of the XACC Accelerator, AcceleratorBuffer and Composite
+             Instruction interfaces used by QAOA.py, such that the benchmark
+             pipeline runs without an XACC installation. XASM circuits using
+             the H, X, Rx, Ry, Rz, CX and Measure gates (as emitted by
+             extra_gates.py and the QAOA circuit generators) are applied
+             directly to a complex128 statevector. Circuits built with the
+             extra_gates.Circuit instruction buffer skip XASM parsing. Measurement counts are
+             sampled from the final state in the XACC bitstring format,
+             character k is the k-th measured qubit (qubit k for the QAOA
+             circuits, as for the XACC backends, which reverse the qiskit
+             order). All cost functions read character k as node k. The
+             exact probability of every measured bitstring is stored in the
+             buffer as well, for shot-noise free expectation values.
+"""
+
+import re
+import numpy as np
+from extra_gates import Parameter
+
+#Gate name, qubit operands and optional rotation angle of an XASM instruction
+INSTRUCTION = re.compile(r'(\w+)\(\s*q\[(\d+)\]\s*(?:,\s*q\[(\d+)\]\s*)?(?:,\s*([^)]+?)\s*)?\)\s*;')
+KERNEL = re.compile(r'__qpu__\s+void\s+(\w+)\s*\(([^)]*)\)')
+ANGLE = re.compile(r'^\s*([-+0-9.eE]+)\s*\*\s*(\w+)\s*$')
+
+def parse_angle(angle):
+    """
+    Parameters:
+        angle : string - Numeric XASM angle or symbolic angle coef*name
+
+    Returns:
+        angle : float or Parameter - Parsed rotation angle
+    """
+
+    symbolic = ANGLE.match(angle)
+    if symbolic:
+        return Parameter(symbolic.group(2), float(symbolic.group(1)))
+
+    return float(angle)
+
+class Program:
+    """
+    Compiled circuit for the statevector simulator: a list of (gate, qubits,
+    angle) instructions plus the names of the free circuit parameters.
+    """
+
+    def __init__(self, name, variables, instructions):
+        self.name = name
+        self.variables = variables
+        self.instructions = instructions
+
+    def getVariables(self):
+        return self.variables
+
+    def nInstructions(self):
+        return len(self.instructions)
+
+    def defaultPlacement(self, qpu):
+        #All-to-all connectivity, no placement required
+        pass
+
+    def eval(self, params):
+        """
+        Parameters:
+            params : list - Numerical values for the circuit parameters
+
+        Returns:
+            program : Program - Circuit with all angles bound
+        """
+
+        values = dict(zip(self.variables, params))
+        instructions = [(gate, qubits, angle.bind(values)
+                         if isinstance(angle, Parameter) else angle)
+                        for gate, qubits, angle in self.instructions]
+
+        return Program(self.name, [], instructions)
+
+class Buffer:
+    """
+    Register of qubits that stores the measurement results of the last
+    execution.
+    """
+
+    def __init__(self, n_qubits):
+        self.n_qubits = n_qubits
+        self.counts = {}
+        self.probabilities = None
+        self.information = {}
+        self.children = []
+
+    def size(self):
+        return self.n_qubits
+
+    def getMeasurementCounts(self):
+        return self.counts
+
+    def getProbabilities(self):
+        return self.probabilities
+
+    def getInformation(self):
+        return self.information
+
+    def getChildren(self):
+        return self.children
+
+    def resetBuffer(self):
+        self.counts = {}
+        self.probabilities = None
+        self.information = {}
+        self.children = []
+
+class StatevectorSimulator:
+    """
+    NumPy statevector simulator with the XACC Accelerator interface.
+    """
+
+    def __init__(self, shots = 2048, seed = None):
+        self.shots = shots
+        self.rng = np.random.default_rng(seed)
+
+    def name(self):
+        return 'native'
+
+    def qalloc(self, n_qubits):
+        return Buffer(n_qubits)
+
+    def compile(self, circuit):
+        """
+        Parameters:
+            circuit : string - XASM kernel source
+
+        Returns:
+            program : Program - Parsed circuit
+        """
+
+        kernel = KERNEL.search(circuit)
+        name = kernel.group(1)
+        variables = [arg.split()[-1] for arg in kernel.group(2).split(',')
+                     if arg.split()[0] == 'double']
+
+        body = re.sub(r'//[^\n]*', '', circuit[kernel.end():])
+        instructions = []
+        for gate, q0, q1, angle in INSTRUCTION.findall(body):
+            qubits = (int(q0),) if not q1 else (int(q0), int(q1))
+            instructions.append((gate, qubits, parse_angle(angle) if angle else None))
+
+        return Program(name, variables, instructions)
+
+    def simulate(self, n_qubits, program):
+        """
+        Parameters:
+            n_qubits : int - Number of qubits in the register
+            program : Program - Circuit with all angles bound
+
+        Returns:
+            state : numpy array - Final statevector, qubit k is bit k of the
+                    basis state index
+            measured : list - Measured qubits in order of measurement
+        """
+
+        state = np.zeros(2**n_qubits, dtype=np.complex128)
+        state[0] = 1
+        measured = []
+
+        for gate, qubits, angle in program.instructions:
+            if gate == 'Measure':
+                measured.append(qubits[0])
+            elif gate == 'CX':
+                apply_cx(state, n_qubits, qubits[0], qubits[1])
+            elif gate == 'Rz':
+                apply_phase(state, n_qubits, qubits[0], np.exp(-0.5j*angle), np.exp(0.5j*angle))
+            elif gate == 'X':
+                apply_1q(state, n_qubits, qubits[0], X)
+            elif gate == 'H':
+                apply_1q(state, n_qubits, qubits[0], H)
+            elif gate == 'Rx':
+                c, s = np.cos(angle/2), np.sin(angle/2)
+                apply_1q(state, n_qubits, qubits[0], np.array([[c, -1j*s], [-1j*s, c]]))
+            elif gate == 'Ry':
+                c, s = np.cos(angle/2), np.sin(angle/2)
+                apply_1q(state, n_qubits, qubits[0], np.array([[c, -s], [s, c]]))
+            else:
+                raise ValueError('Unsupported gate for native simulator: '+gate)
+
+        if not measured:
+            measured = list(range(n_qubits))
+
+        return state, measured
+
+    def execute(self, buffer, program):
+        """
+        Parameters:
+            buffer : Buffer - Register used to store measurement counts
+            program : Program or list - Circuit with all angles bound, for a 
+                      list of circuits the results are stored in child buffers
+
+        Returns:
+            none
+        """
+
+        if isinstance(program, list):
+            buffer.children = []
+            for prog in program:
+                child = Buffer(buffer.size())
+                self.execute(child, prog)
+                buffer.children.append(child)
+            return
+
+        n_qubits = buffer.size()
+        state, measured = self.simulate(n_qubits, program)
+        probs = marginal_probabilities(state, n_qubits, measured)
+
+        buffer.probabilities = probs
+        samples = self.rng.multinomial(self.shots, probs)
+        n_bits = len(measured)
+        buffer.counts = {format(int(i), '0%ib' % n_bits) : int(samples[i])
+                         for i in np.flatnonzero(samples)}
+
+H = np.array([[1, 1], [1, -1]], dtype=np.complex128)/np.sqrt(2)
+X = np.array([[0, 1], [1, 0]], dtype=np.complex128)
+
+def apply_1q(state, n_qubits, qubit, U):
+    """
+    Apply the 2x2 matrix U to qubit of the statevector in place.
+    """
+
+    psi = state.reshape(2**(n_qubits-qubit-1), 2, 2**qubit)
+    psi[:] = np.einsum('ij,ajb->aib', U, psi)
+
+def apply_phase(state, n_qubits, qubit, phase0, phase1):
+    """
+    Apply the diagonal matrix diag(phase0, phase1) to qubit in place.
+    """
+
+    psi = state.reshape(2**(n_qubits-qubit-1), 2, 2**qubit)
+    psi[:, 0, :] *= phase0
+    psi[:, 1, :] *= phase1
+
+def apply_cx(state, n_qubits, control, target):
+    """
+    Apply a CX gate to the statevector in place.
+    """
+
+    psi = state.reshape([2]*n_qubits)
+    c_axis = n_qubits - control - 1
+    t_axis = n_qubits - target - 1
+
+    index = [slice(None)]*n_qubits
+    index[c_axis] = 1
+    sub = psi[tuple(index)]
+    sub[:] = np.flip(sub, axis = t_axis if t_axis < c_axis else t_axis - 1).copy()
+
+def marginal_probabilities(state, n_qubits, measured):
+    """
+    Parameters:
+        state : numpy array - Statevector
+        n_qubits : int - Number of qubits in the register
+        measured : list - Measured qubits in order of measurement
+
+    Returns:
+        probs : numpy array - Probability per measured bitstring, the first
+                measured qubit is the most significant bit
+    """
+
+    probs = (np.abs(state)**2).reshape([2]*n_qubits)
+    axes = [n_qubits - q - 1 for q in measured]
+    other = tuple(a for a in range(n_qubits) if a not in axes)
+    probs = probs.sum(axis = other)
+
+    #Remaining axes are in ascending order, reorder to measurement order
+    remaining = sorted(axes)
+    probs = np.transpose(probs, [remaining.index(a) for a in axes]).ravel()
+
+    return probs/probs.sum()
@@ -0,0 +1,117 @@
+"""
+Project: QAOA Benchmarks XACC platform
+Description: Lightweight tracing of the QAOA hot path. Every optimizer
+             iteration is split in spans for the circuit build, compilation,
+             parameter binding, execution, runtime lookup, result retrieval
+             and scoring stages, timed with the monotonic perf_counter_ns.
+             Spans are only recorded while a tracer is active, otherwise
+             span() is a no-op. Traces are exported in the Chrome trace
+             event format (chrome://tracing, Perfetto) and summarized per
+             stage, showing whether wall-clock goes to the simulator or to
+             Python overhead in the harness.
+"""
+
+import os
+import json
+import threading
+from time import perf_counter_ns
+from contextlib import contextmanager, nullcontext
+
+#Tracer of the current run, None disables tracing
+_active = None
+
+class Tracer:
+    """
+    Collects (name, start, end, thread, args) spans in nanoseconds.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.spans = []
+        self.origin = perf_counter_ns()
+
+    @contextmanager
+    def span(self, name, **args):
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            #list.append is atomic, worker threads can share the tracer
+            self.spans.append((name, start, perf_counter_ns(), threading.get_ident(), args))
+
+    def summary(self):
+        """
+        Returns:
+            summary : dict - Per stage the number of spans, total and mean
+                      duration in ms. Stages may be nested (compile is part
+                      of build), so totals are inclusive
+        """
+
+        totals = {}
+        for name, start, end, tid, args in self.spans:
+            count, total = totals.get(name, (0, 0))
+            totals[name] = (count + 1, total + end - start)
+
+        return {name : {'count' : count, 'total_ms' : total/1e6, 'mean_ms' : total/count/1e6}
+                for name, (count, total) in totals.items()}
+
+    def format_summary(self):
+        lines = ['Trace summary: '+self.name]
+        for name, stats in sorted(self.summary().items(), key = lambda item: -item[1]['total_ms']):
+            lines.append('  %-10s %6i spans %12.3f ms total %10.3f ms mean'
+                         % (name, stats['count'], stats['total_ms'], stats['mean_ms']))
+
+        return '\n'.join(lines)
+
+    def chrome_trace(self):
+        """
+        Returns:
+            trace : dict - Spans as complete ('X') events of the Chrome trace
+                    event format, timestamps in us since the tracer started
+        """
+
+        pid = os.getpid()
+        threads = {}
+        events = []
+        for name, start, end, tid, args in self.spans:
+            events.append({'name' : name, 'ph' : 'X', 'pid' : pid,
+                           'tid' : threads.setdefault(tid, len(threads)),
+                           'ts' : (start - self.origin)/1000, 'dur' : (end - start)/1000,
+                           'args' : args})
+
+        return {'traceEvents' : events, 'displayTimeUnit' : 'ms',
+                'otherData' : {'run' : self.name, 'summary' : self.summary()}}
+
+    def export(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+        with open(path, 'w') as file:
+            json.dump(self.chrome_trace(), file)
+
+def start(name):
+    """
+    Activate a new tracer for the run name and return it.
+    """
+
+    global _active
+    _active = Tracer(name)
+    return _active
+
+def stop():
+    """
+    Deactivate and return the current tracer.
+    """
+
+    global _active
+    tracer, _active = _active, None
+    return tracer
+
+def span(name, **args):
+    """
+    Context manager timing the stage name on the active tracer, a no-op if
+    tracing is inactive.
+    """
+
+    if _active is None:
+        return nullcontext()
+
+    return _active.span(name, **args)